@@ -1,12 +1,204 @@
-import streamlit as st
+import os
+import time
+
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
-import scipy.stats as stats
+import streamlit as st
+import tera_charts
+import tera_insights
+import tera_profile
+import tera_quality
+import tera_stats
+from tera_cube import load_cube
+from tera_data import load_registry
+from tera_trajectory import load_trajectories
+
+# Stage timings are shown in the sidebar: TERA_PROFILE=1 records every session (with memory),
+# ?profile=1 only this one, into its session state
+profile_samples = None
+if st.query_params.get("profile") == "1":
+    profile_samples = st.session_state.setdefault("profile_samples", tera_profile.new_samples())
+tera_profile.use_session(profile_samples)
+rerun_start = time.perf_counter()
+
+def plotly_chart(fig):
+    """st.plotly_chart, timed: it includes serializing the figure for the browser."""
+    with tera_profile.timer("st.plotly_chart"):
+        st.plotly_chart(fig)
+
 
-data= pd.read_csv("all.csv")
-data["year"] = data["year"].astype(str)
+########################################
+# Data Analysis sections; only the one selected is computed on a rerun
+def overall_section():
+    """Overall distribution of evaluation scores."""
+    st.subheader("Overall Distribution of Evaluation Scores",divider=True)
+    fig_hist, fig_pie = tera_charts.overall_figures(path=data_path)
+    col1, col2 = st.columns([3,1],gap="medium")
+    with col1:
+        plotly_chart(fig_hist)
+    with col2:
+        plotly_chart(fig_pie)
+
+    st.markdown(tera_insights.narrative("overall", data_path))
+
+
+def district_section():
+    """Score distribution and averages by district."""
+    st.subheader("Evaluation Score Distribution by District",divider=True)
+
+    district_options = cube.options("districtname")
+    selected_district = st.selectbox("Please select a district to view the distribution of teacher evaluation scores below:", district_options)
+    fig_hist, fig_pie = tera_charts.district_figures(selected_district, path=data_path)
+
+    col1, col2 = st.columns([3,1],gap="medium")
+
+    with col1:
+        plotly_chart(fig_hist)
+
+    with col2:
+        plotly_chart(fig_pie)
+
+    #average
+    plotly_chart(tera_charts.district_average_figure(path=data_path))
+
+    ########################
+    # average by distrct
+    plotly_chart(tera_charts.year_district_average_figure(path=data_path))
+
+    st.markdown(tera_insights.narrative("district", data_path))
+
+
+def year_section():
+    """Score distribution and averages by year."""
+    st.subheader("Evaluation Scores Across Years",divider=True)
+
+    selected_district = st.selectbox("Please select a district to compare its score distribution across years:",
+                                     cube.options("districtname"), key="year_district")
+    plotly_chart(tera_charts.year_overlay_figure(selected_district, path=data_path))
+
+    district_options = cube.options("year")
+    selected_year= st.selectbox("Please select a year to view the distribution of teacher evaluation scores below:", district_options)
+    fig_hist, fig_pie = tera_charts.year_figures(selected_year, path=data_path)
+    col1, col2 = st.columns([3,1],gap="medium")
+    with col1:
+        plotly_chart(fig_hist)
+    with col2:
+        plotly_chart(fig_pie)
+
+
+    #AVERAGE
+    plotly_chart(tera_charts.year_average_figure(path=data_path))
+
+    st.markdown(tera_insights.narrative("year", data_path))
+
+
+def gender_section():
+    """Association with gender, distribution and averages by gender."""
+    st.subheader("Evaluation Scores by Gender",divider=True)
+    # Chi-square on the cube's gender x eval counts, cached per dataset version
+    cramers_v = tera_stats.association("gender_label", data_path)["cramers_v"]
+    # Display the result
+    st.write(f"Cramer's V between Gender and Evaluation: **{cramers_v:.4f}**")
+    st.write('This suggests that a teacher’s gender does not significantly impact their evaluation scores based on this dataset.The relationship observed is likely due to random variation rather than a meaningful pattern.')
+
+    fig_hist, fig_pie = tera_charts.gender_figures(path=data_path)
+    col1, col2 = st.columns([3,1],gap="medium")
+    with col1:
+        plotly_chart(fig_hist)
+    with col2:
+        plotly_chart(fig_pie)
+
+    #AVERAGE
+    plotly_chart(tera_charts.gender_average_figure(path=data_path))
+
+    plotly_chart(tera_charts.year_gender_average_figure(path=data_path))
+
+    #st.dataframe(avg_eval_by_year_gender)
+    st.markdown(tera_insights.narrative("gender", data_path))
+
+
+def race_section():
+    """Association with race, distribution and averages by race."""
+    st.subheader("Evaluation Scores by Race",divider=True)
+    cramers_v = tera_stats.association("reth", data_path)["cramers_v"]
+    # Display the result
+    st.write(f"Cramer's V between Race and Evaluation: **{cramers_v:.4f}**")
+    st.write('There is no strong evidence that race/ethnicity is a significant factor in teacher evaluations based on the data. However, Small sample size in some racial groups could affect the statistical significance of the relationship.')
+
+
+    fig_hist, fig_pie = tera_charts.race_figures(path=data_path)
+    col1, col2 = st.columns([3,1],gap="medium")
+    with col1:
+        plotly_chart(fig_hist)
+    with col2:
+        plotly_chart(fig_pie)
+
+    plotly_chart(tera_charts.race_average_figure(path=data_path))
+
+    plotly_chart(tera_charts.year_race_average_figure(path=data_path))
+
+    st.markdown(tera_insights.narrative("race", data_path))
+
+    with st.expander("Cramer's V by District and Year"):
+        # Every demographic x stratum in one vectorized pass over the cube counts
+        st.dataframe(tera_stats.association_table(path=data_path), hide_index=True)
+
+
+def district_race_section():
+    """Scores by gender and year for one district and race."""
+    st.subheader("Evaluation Scores by distrct by gender",divider=True)
+    district_options = cube.options("districtname")
+    race_options = ['White','Black','Hispanic',"Other"]
+    col1, col2 = st.columns([1,1],gap="medium")
+    with col1:
+        selected_district = st.selectbox("Select District", district_options)
+    with col2:
+        selected_race = st.selectbox("Select Race", race_options)
+
+    fig_hist, year_fig = tera_charts.district_race_figures(selected_district, selected_race, path=data_path)
+
+    col1, col2 = st.columns([1,1],gap="medium")
+    with col1:
+        plotly_chart(fig_hist)
+    with col2:
+        plotly_chart(year_fig)
+
+    st.markdown(tera_insights.narrative("district_race", data_path, race=selected_race))
+
+    #st.dataframe(avg_eval_by_district_by_year)
+
+
+def teacher_section():
+    """Score changes, retention and transfers of teachers followed across years."""
+    st.subheader("Teacher Trajectories", divider=True)
+    trajectories = load_trajectories(data_path)
+    district = st.selectbox("Please select a district to see how returning teachers' scores changed:",
+                            ["All districts"] + cube.options("districtname"), key="trajectory_district")
+    plotly_chart(tera_charts.score_change_figure(None if district == "All districts" else district, path=data_path))
+
+    st.markdown("###### **Retention by District and Year**")
+    st.dataframe(trajectories.retention(), hide_index=True,
+                 column_config={"retention_rate": st.column_config.NumberColumn(format="percent")})
+    st.markdown("###### **Teachers Moving Between Districts** (from one year to the next)")
+    st.dataframe(trajectories.transfers())
+
+    teacher_id = st.number_input("Look up a teacher id:", min_value=0, step=1,
+                                 value=int(trajectories.ids[0]) if len(trajectories) else 0)
+    records = trajectories.lookup(teacher_id)
+    if records.empty:
+        st.write(f"No records for teacher {teacher_id}.")
+    else:
+        st.dataframe(records, hide_index=True)
+
+
+SECTIONS = {
+    "Overall": overall_section,
+    "District": district_section,
+    "Year": year_section,
+    "Gender": gender_section,
+    "Race": race_section,
+    "District × Race": district_race_section,
+    "Teachers": teacher_section,
+}
 
 # Set page configuration
 #st.set_page_config(page_title="Teacher Evaluation Dashboard", layout="wide")
@@ -14,6 +206,12 @@ data["year"] = data["year"].astype(str)
 # Sidebar navigation
 st.sidebar.title("TERA")
 page = st.sidebar.radio("Go to", ["Data Prepare", "Data Analysis"])
+# Datasets listed in datasets.json (TERA_DATASETS) share their memory-mapped stores across sessions
+datasets = load_registry()
+dataset = st.sidebar.selectbox("Dataset", list(datasets)) if len(datasets) > 1 else next(iter(datasets))
+data_path = datasets[dataset]
+# Group-bys and counts are answered from precomputed aggregates instead of the rows
+cube = load_cube(data_path)
 ########################################
 
 
@@ -67,7 +265,30 @@ if page == "Data Prepare":
     - Merge `combined_teval.csv` and `combined_tdemo.csv` on `"id"`, `"year"`, and `"districtname"`.  
     - Since `"districtno"` and `"districtname"` are duplicates, remove `"districtno"` from both files before merging.  
     - Save the final dataset as `all.csv`.  
+
+    All of the steps above are automated by `python tera_pipeline.py`, which runs them in memory and only reprocesses years whose `teval`/`tdemo` files changed.  
     """)
+
+    # Written by the pipeline's validation stage on every ingest, next to the extracts
+    report = tera_quality.load_report(os.path.join(os.path.dirname(data_path), tera_quality.QUALITY_FILE))
+    if report is not None:
+        st.subheader("Validation Report", divider=True)
+        summary = report["summary"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Duplicate keys dropped", f"{summary['duplicate_keys']:,}",
+                    help=f"{summary.get('incomplete_rows', 0):,} more rows were dropped for a missing id, year or gender")
+        col2.metric("Unmatched rows", f"{summary['unmatched_demo'] + summary['unmatched_eval']:,}",
+                    help=f"{summary['unmatched_demo']:,} demographic, {summary['unmatched_eval']:,} evaluation")
+        col3.metric("Out-of-domain values", f"{summary['invalid_values']:,}")
+        col4.metric("District ID conflicts", summary["district_conflicts"])
+        st.dataframe(tera_quality.file_table(report), hide_index=True)
+        for conflict in report["district_conflicts"]:
+            if isinstance(conflict["districtname"], str):
+                uses = "; ".join(f"{no} in {', '.join(files)}" for no, files in conflict["districtno"].items())
+                st.markdown(f"- **{conflict['districtname']}** has several `districtno` values: {uses}")
+            else:
+                uses = "; ".join(f"{name} in {', '.join(files)}" for name, files in conflict["districtname"].items())
+                st.markdown(f"- `districtno` **{conflict['districtno']}** is used by several districts: {uses}")
     st.subheader("Data Quality Issues & Governance Suggestions", divider=True)
 
     st.markdown("""
@@ -122,421 +343,15 @@ if page == "Data Prepare":
 ######################
 elif page == "Data Analysis":
     st.header("Data Analysis")
-    st.subheader("Overall Distribution of Evaluation Scores",divider=True)
-    fig_hist= px.histogram(data, y="eval", title="Distribution of Evaluation Scores",
-                        orientation='h' )
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-
-    pie_data = data['eval'].value_counts().reset_index()
-    pie_data.columns = ['Evaluation', 'Count']
-    fig_pie = px.pie(pie_data, names='Evaluation', values='Count', hole=0.3)
-    col1, col2 = st.columns([3,1],gap="medium")
-    with col1:
-        st.plotly_chart(fig_hist)
-    with col2:
-        st.plotly_chart(fig_pie)
-
-    st.markdown("""
-    ###### **Evaluation Score Distribution**  
-
-    - The most common evaluation score is **4**, accounting for **5,215** instances (**36.7%** of all records).  
-    - The second most common score is **3**, with **4,408** instances (**31.1%** of all records).  
-    """)
-
-    ##################################################
-    st.subheader("Evaluation Score Distribution by District",divider=True)
-
-    color_map = {
-        "Radnor": "darkorange",
-        "Westlake": "darkred",
-        "Kentwood": "darkgreen"
-    }
-
-    district_options = data["districtname"].unique()
-    selected_district = st.selectbox("Please select a district to view the distribution of teacher evaluation scores below:", district_options)
-    filtered_data = data[data["districtname"] == selected_district]
-
-    hist_color = color_map.get(selected_district, "blue")
-    fig_hist = px.histogram(filtered_data, y="eval", title=f"Evaluation Score Distribution in {selected_district} District",
-                            labels={"eval": "Evaluation"}, 
-                            color_discrete_sequence=[hist_color],orientation='h')
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-    pie_data = filtered_data['eval'].value_counts().reset_index()
-    pie_data.columns = ['Evaluation', 'Count']
-
-    fig_pie = go.Figure(data=[go.Pie(labels=pie_data['Evaluation'], values=pie_data['Count'], hole=0.3)])
-    fig_pie.update_layout()
-
-    col1, col2 = st.columns([3,1],gap="medium")
-
-    with col1:
-        st.plotly_chart(fig_hist)
-
-    with col2:
-        st.plotly_chart(fig_pie)
-
-    #average
-    avg_eval_by_district = data.groupby("districtname")["eval"].mean().reset_index()
-    district_fig = px.bar(avg_eval_by_district, x="districtname", y="eval", 
-                        title="Average Evaluation Scores Across Districsts",
-                        labels={"eval": "Average Evaluation Score"},
-                        color="districtname",
-                        text_auto='.3s',
-                        color_discrete_map=color_map)  # Update y-axis label
-    district_fig.update_yaxes(range=[avg_eval_by_district["eval"].min() -0.25, avg_eval_by_district["eval"].max() + 0.25])
-    district_fig.update_xaxes(title_text="District") 
-    st.plotly_chart(district_fig)
-
-    ########################
-    # average by distrct
-    data['eval'] = pd.to_numeric(data['eval'], errors='coerce')
-    avg_eval_by_year_district = data.groupby(["year", "districtname"])["eval"].mean().reset_index()
-
-    # Create the bar chart
-    year_district_fig = px.bar(
-        avg_eval_by_year_district, 
-        x="year", 
-        y="eval", 
-        color="districtname",  
-        title="Average Evaluation Scores by Each Year Across Districts",
-        labels={"eval": "Average Evaluation Score", "year": "Year", "districtname": "District"},
-        barmode="group",
-        text_auto='.3s',
-        color_discrete_map=color_map
-    )
-
-    # Show the chart in Streamlit
-    st.plotly_chart(year_district_fig)
-
-    st.markdown("""
-        ###### **Evaluation Score Trends by District**  
-
-        - In both **Radnor** and **Kentwood** districts, the most common score is **4**, while in **Westlake**, the most common score is **3**.  
-        - **Kentwood** has the highest overall average score (**3.74**), whereas **Westlake** has the lowest (**3.51**) over the three-year period.  
-        - However, in **2015**, **Westlake** recorded the highest average score (**3.70**), while **Kentwood** had the lowest (**3.39**) among the three districts.  
-        - **Kentwood's** average score declined from **2013 to 2015**, whereas **Westlake's** average score increased over the same period.  
-        """)
-    ########################################################
-    color_map1 = {
-        "2013": "steelblue",
-        "2014": "deepskyblue",
-        "2015": "dodgerblue"
-    }
-    st.subheader("Evaluation Scores Across Years",divider=True)
-
-
-    fig_hist = px.histogram(filtered_data, y="eval", 
-                            title=f"Overlaid Evaluation Score Distribution by Year",
-                            labels={"eval": "Evaluation"}, 
-                            color="year", 
-                            orientation='h',
-                            barmode='overlay',
-                            color_discrete_map=color_map1)
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-    st.plotly_chart(fig_hist)
-
-
-
-    district_options = data["year"].unique()
-    selected_year= st.selectbox("Please select a year to view the distribution of teacher evaluation scores below:", district_options)
-    filtered_data = data[data["year"] == selected_year]
-    hist_color = color_map1.get(selected_year, "blue")
-    fig_hist = px.histogram(filtered_data, y="eval", 
-            title=f"Evaluation Score Distribution in year {selected_year}",
-                            labels={"eval": "Evaluation"}, 
-                            color_discrete_sequence=[hist_color],
-                            orientation='h')
-
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-
-    pie_data = filtered_data['eval'].value_counts().reset_index()
-    pie_data.columns = ['Evaluation', 'Count']
-
-    fig_pie = go.Figure(data=[go.Pie(labels=pie_data['Evaluation'], 
-                        values=pie_data['Count'], hole=0.3)])
-    fig_pie.update_layout()
-    col1, col2 = st.columns([3,1],gap="medium")
-    with col1:
-        st.plotly_chart(fig_hist)
-    with col2:
-        st.plotly_chart(fig_pie)
-
-
-    #AVERAGE
-    avg_eval_by_year = data.groupby("year")["eval"].mean().reset_index()
-    year_fig = px.bar(avg_eval_by_year, x="year", y="eval", 
-                    title="Average Evaluation Scores by Year",
-                    color="year",        
-                    text_auto='.3s',        
-                    color_discrete_map=color_map1)
-    year_fig.update_yaxes(range=[avg_eval_by_year["eval"].min() -0.25, avg_eval_by_district["eval"].max() + 0.25])
-    year_fig.update_xaxes(title_text="Year",dtick=1) 
-    year_fig.update_yaxes(title_text="Average Evaluation Score") 
-    st.plotly_chart(year_fig)
-
-
-    st.markdown("""
-    ###### **Evaluation Score Trends by Year**  
-
-    - **2013** recorded the highest number of **5** scores among the three years, with a total of **910** instances.  
-    - **2013** also had the highest count of **4** scores, totaling **1,595**.  
-    - **2014** saw the highest number of **2** scores, with a total of **595** instances.  
-    - The highest average score occurred in **2013**, with an average of **3.79**.  
-    - The lowest average score was observed in **2014**, with an average of **3.47**.  
-    """)
-
-    ########################################################
-
-    color_map2 = {
-        "Female": "lightpink",
-        "Male": "lightblue",
-
-    }
-
-    st.subheader("Evaluation Scores by Gender",divider=True)
-    data['female'] = data['female'].astype('category')
-    #data['eval'] = data['eval'].astype('category')
-    contingency_table = pd.crosstab(data['female'], data['eval'])
-    n = contingency_table.sum().sum()  # Total number of observations
-    min_dim = min(contingency_table.shape) - 1  # The minimum of the number of rows - 1 or columns - 1
-    chi2, p, dof, expected = stats.chi2_contingency(contingency_table)
-    # Calculate Cramer's V
-    cramers_v = np.sqrt(chi2 / (n * min_dim))
-    # Display the result
-    st.write(f"Cramer's V between Gender and Evaluation: **{cramers_v:.4f}**")
-    st.write('This suggests that a teacher’s gender does not significantly impact their evaluation scores based on this dataset.The relationship observed is likely due to random variation rather than a meaningful pattern.')
-    data['gender_label'] = data['female'].map({1: 'Female', 0: 'Male'})
-
-    fig_hist = px.histogram(data, y="eval", 
-                            title=f"Overlaid Evaluation Score Distribution by Gender",
-                            labels={"eval": "Evaluation","gender_label":"Gender"}, 
-                            color="gender_label", 
-                            orientation='h',
-                            barmode='overlay',
-                            color_discrete_map=color_map2)
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-
-    #st.plotly_chart(fig_hist)
-
-    pie_data = data['gender_label'].value_counts().reset_index()
-    pie_data.columns = ['Gender', 'Count']
-    fig_pie = px.pie(pie_data,  values='Count', hole=0.3, color="Gender",
-                    color_discrete_map=color_map2)
-    col1, col2 = st.columns([3,1],gap="medium")
-    with col1:
-        st.plotly_chart(fig_hist)
-    with col2:
-        st.plotly_chart(fig_pie)
-
-    #AVERAGE
-    avg_eval_by_gender = data.groupby("gender_label")["eval"].mean().reset_index()
-    gender_fig = px.bar(avg_eval_by_gender, x="gender_label", y="eval", 
-                    title="Average Evaluation Scores by Gender",
-                    labels={"gender_label":"Gender"},
-                    color="gender_label",  
-                    text_auto='.3s',              
-                    color_discrete_map=color_map2)
-    gender_fig.update_yaxes(range=[avg_eval_by_gender["eval"].min() -0.25, avg_eval_by_gender["eval"].max() + 0.25])
-    #gender_fig.update_xaxes(title_text="Year",dtick=1) 
-    gender_fig.update_yaxes(title_text="Average Evaluation Score") 
-    st.plotly_chart(gender_fig)
-
-
-    #data['eval'] = pd.to_numeric(data['eval'], errors='coerce')
-    avg_eval_by_year_gender = data.groupby(["year", "gender_label"])["eval"].mean().reset_index()
-
-    # Create the bar chart
-    year_district_fig = px.bar(
-        avg_eval_by_year_gender, 
-        x="year", 
-        y="eval", 
-        color="gender_label",  
-        title="Average Evaluation Scores by Gender in Three years",
-        labels={"eval": "Average Evaluation Score", "year": "Year", "gender_label": "Gender"},
-        barmode="group",
-        text_auto='.3s',
-        color_discrete_map=color_map2
-    )
-    year_district_fig.update_yaxes(range=[avg_eval_by_year_gender["eval"].min() -0.25, avg_eval_by_year_gender["eval"].max() + 0.25])
-
-    # Show the chart in Streamlit
-    st.plotly_chart(year_district_fig)
-
-    #st.dataframe(avg_eval_by_year_gender)
-    st.markdown("""
-    ###### **Evaluation Scores by Gender**  
-
-    - The number of **female** participants(contain repeat) is higher than that of **male** participants, with **11,680** females (representing **79.6%**) and **2,292** males (representing **20.4%**).  
-    - There is very little difference in the average scores between genders, with females having an average score of **3.59** and males having an average score of **3.60**.  
-    """)
-
-
-
-    ########################################################
-    color_map3 = {
-        "White": px.colors.qualitative.Safe[0],
-        "Black": px.colors.qualitative.Alphabet[11],
-        "Hispanic":px.colors.qualitative.Plotly[2],
-        "Other":px.colors.qualitative.Plotly[0]
-    }
-
-    st.subheader("Evaluation Scores by Race",divider=True)
-    data['eval'] = data['eval'].astype('category')
-    contingency_table = pd.crosstab(data['reth'], data['eval'])
-    n = contingency_table.sum().sum()  # Total number of observations
-    min_dim = min(contingency_table.shape) - 1  # The minimum of the number of rows - 1 or columns - 1
-    chi2, p, dof, expected = stats.chi2_contingency(contingency_table)
-    # Calculate Cramer's V
-    cramers_v = np.sqrt(chi2 / (n * min_dim))
-    # Display the result
-    st.write(f"Cramer's V between Race and Evaluation: **{cramers_v:.4f}**")
-    st.write('There is no strong evidence that race/ethnicity is a significant factor in teacher evaluations based on the data. However, Small sample size in some racial groups could affect the statistical significance of the relationship.')
-
-
-    fig_hist = px.histogram(data, y="eval", 
-                            title=f"Overlaid Evaluation Score Distribution by Race",
-                            labels={"eval": "Evaluation"}, 
-                            color="reth", 
-                            orientation='h',
-                            barmode='overlay',
-                            color_discrete_map=color_map3)
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation") 
-    #st.plotly_chart(fig_hist)
-    pie_data = data['reth'].value_counts().reset_index()
-    pie_data.columns = ['Race', 'Count']
-    fig_pie = px.pie(pie_data,  values='Count', hole=0.3, color="Race",
-                    color_discrete_map=color_map3)
-    col1, col2 = st.columns([3,1],gap="medium")
-    with col1:
-        st.plotly_chart(fig_hist)
-    with col2:
-        st.plotly_chart(fig_pie)
-
-    data['eval'] = pd.to_numeric(data['eval'], errors='coerce')
-    avg_eval_by_race = data.groupby("reth")["eval"].mean().reset_index()
-    custom_order = ["White", "Black", "Hispanic", "Other"]
-    race_fig = px.bar(avg_eval_by_race, x="reth", y="eval", 
-                    title="Average Evaluation Scores by Race",
-                    labels={"race":"Race"},
-                    category_orders={"reth": custom_order},
-                    color="reth",           
-                    text_auto='.3s',     
-                    color_discrete_map=color_map3)
-    race_fig.update_yaxes(range=[avg_eval_by_race["eval"].min() -0.25, avg_eval_by_race["eval"].max() + 0.25])
-    race_fig.update_yaxes(title_text="Average Evaluation Score") 
-    st.plotly_chart(race_fig)
-    #st.dataframe(avg_eval_by_race)
-
-
-    avg_eval_by_year_race = data.groupby(["year", "reth"])["eval"].mean().reset_index()
-
-    # Create the bar chart
-    race_fig = px.bar(
-        avg_eval_by_year_race, 
-        x="year", 
-        y="eval", 
-        color="reth",  
-        title="Average Evaluation Scores by Race in Three years",
-        labels={"eval": "Average Evaluation Score", "year": "Year", "reth": "Race"},
-        barmode="group",
-        text_auto='.3s',
-        color_discrete_map=color_map3
-    )
-    race_fig.update_yaxes(range=[avg_eval_by_year_race["eval"].min() -0.25, avg_eval_by_year_race["eval"].max() + 0.25])
-
-    # Show the chart in Streamlit
-    st.plotly_chart(race_fig)
-    #st.dataframe(avg_eval_by_year_race)
-
-    st.markdown("""
-    ###### **Evaluation Scores by Race**  
-
-    - **White** teachers represent **88.5%** of the total, with **12,777** instances.  
-    - The second-largest group is **Black**, comprising **7.29%** of the total, with **1,053** instances.  
-    - **Other** races have the highest average score of **3.71**, followed by **Hispanic** students with an average score of **3.68**.  
-    """)
-
-
-    ###########################
-    #by district by gender
-    st.subheader("Evaluation Scores by distrct by gender",divider=True)
-    district_options = data['districtname'].unique()
-    race_options = ['White','Black','Hispanic',"Other"]
-    col1, col2 = st.columns([1,1],gap="medium")
-    with col1:
-        selected_district = st.selectbox("Select District", district_options)
-    with col2:
-        selected_race = st.selectbox("Select Race", race_options)
-
-    filtered_data = data[data['districtname'] == selected_district]
-    filtered_data2=filtered_data[filtered_data['reth']==selected_race]
-    filtered_data2['gender_label'] = filtered_data2['female'].map({1: 'Female', 0: 'Male'})
-
-    # Create the histogram
-    fig_hist = px.histogram(
-        filtered_data2, 
-        y="eval", 
-        title=f"Overlaid Evaluation Score Distribution by Gender in {selected_district}",
-        labels={"eval": "Evaluation", "gender_label": "Gender"}, 
-        color="gender_label", 
-        orientation='h',  # Horizontal orientation
-        barmode='overlay',  # Overlaid bars
-        color_discrete_map=color_map1  
-    )
-
-    fig_hist.update_xaxes(title_text="Count") 
-    fig_hist.update_yaxes(title_text="Evaluation")
-    #st.plotly_chart(fig_hist)
-
-
-
-
-    data['eval'] = pd.to_numeric(data['eval'], errors='coerce')
-    avg_eval_by_district_by_year = data.groupby(["districtname", "reth","year"])["eval"].mean().reset_index()
-
-    filtered_avg = avg_eval_by_district_by_year[avg_eval_by_district_by_year["districtname"] == selected_district]
-    filtered_avg2 = filtered_avg [filtered_avg ["reth"] == selected_race]
-
-    year_fig = px.bar(
-        filtered_avg2, 
-        x="year", 
-        y="eval", 
-        title=f"Average Evaluation Scores by Year in {selected_district} with {selected_race}",
-        color="year",                
-        text_auto='.3s',
-        color_discrete_map=color_map1
-    )
-    year_fig.update_yaxes(range=[avg_eval_by_district_by_year["eval"].min() -0.25, avg_eval_by_district_by_year["eval"].max() + 0.25])
-    year_fig.update_xaxes(title_text="Year",dtick=1) 
-    year_fig.update_yaxes(title_text="Average Evaluation Score")
-    #st.plotly_chart(year_fig) 
-
-    col1, col2 = st.columns([1,1],gap="medium")
-    with col1:
-        st.plotly_chart(fig_hist)
-    with col2:
-        st.plotly_chart(year_fig)
-
-    st.markdown("""
-    ###### **Evaluation Scores of White Teachers by District and Year**  
-
-    **1. Radnor District**:  
-    - Highest average score: **3.76** (2013)  
-    - Lowest average score: **3.44** (2014)  
-
-    **2. Kentwood District**:  
-    - Highest average score: **4.43** (2013)  
-    - Lowest average score: **3.39** (2015)  
-
-    **3. Westlake District**:  
-    - Highest average score: **3.78** (2015)  
-    - Lowest average score: **3.12** (2013)  
-    """)
-
-    #st.dataframe(avg_eval_by_district_by_year)
+    section = st.radio("Section", list(SECTIONS), horizontal=True)
+    start = time.perf_counter()
+    with tera_profile.timer(f"section:{section}"):
+        SECTIONS[section]()
+    st.caption(f"Section computed and rendered in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+if tera_profile.active():
+    tera_profile.record("rerun", time.perf_counter() - rerun_start)
+    with st.sidebar.expander("Profile"):
+        st.dataframe(pd.DataFrame.from_dict(tera_profile.report(profile_samples), orient="index"))
+        st.download_button("Export JSON", tera_profile.export_json(samples=profile_samples),
+                           "tera_profile.json", "application/json")
@@ -0,0 +1,137 @@
+"""Benchmark the pipeline and the Data Analysis render on synthetic data of growing size.
+
+Every size gets its own generated extracts under --work-dir (reused while the
+generator settings are unchanged). Each stage runs in a fresh process, so
+caches start cold and its peak memory can be read from the OS:
+
+- pipeline: clean, combine and merge every year (tera_pipeline.run_pipeline)
+- render:   load the cube and draw every Data Analysis section headlessly
+
+    python tera_bench.py --sizes 10000 1000000 10000000 --json bench.json
+
+Peak memory is the largest resident set of the stage's process tree.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import tera_synth
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+STAGES = ["pipeline", "render"]
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TERA.py")
+
+
+def _count_rows(paths):
+    rows = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            rows += sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) - 1
+    return rows
+
+
+def run_stage(stage, data_dir, workers=None):
+    """Run `stage` on `data_dir` in this process; returns its wall time and rows processed."""
+    start = time.perf_counter()
+    if stage == "pipeline":
+        from tera_pipeline import discover_sources, run_pipeline
+        sources = discover_sources(data_dir)
+        rows = _count_rows([p for inputs in sources.values() for paths in inputs.values() for p in paths])
+        run_pipeline(data_dir, os.path.join(data_dir, "all.arrow"), "", force=True, workers=workers,
+                     quality_output=os.path.join(data_dir, "quality.json"))
+    elif stage == "render":
+        from streamlit.testing.v1 import AppTest
+        # TERA.py reads all.arrow from the working directory
+        os.chdir(data_dir)
+        app = AppTest.from_file(APP_FILE, default_timeout=3600)
+        app.run()
+        app.sidebar.radio[0].set_value("Data Analysis").run()
+        for section in app.radio[0].options:
+            app.radio[0].set_value(section).run()
+            if app.exception:
+                raise RuntimeError(f"{section}: {app.exception[0].message}")
+        from tera_cube import load_cube
+        rows = int(load_cube().rows.sum())
+    else:
+        raise ValueError(f"unknown stage {stage!r}")
+    return {"seconds": time.perf_counter() - start, "rows": rows}
+
+
+def measure(stage, data_dir, workers=None):
+    """Run `stage` in a child process and add its peak memory and throughput to the result."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--stage", stage, "--data-dir", data_dir]
+    if workers:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    output = proc.stdout.read()
+    # wait4 reports the child's resource usage, including the workers it waited for
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        raise RuntimeError(f"{stage} failed on {data_dir} (exit code {proc.returncode})")
+    result = json.loads(output.strip().splitlines()[-1])
+    result["rows_per_second"] = result["rows"] / result["seconds"] if result["seconds"] else None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    result["peak_rss_mib"] = usage.ru_maxrss * scale / 2 ** 20
+    return result
+
+
+def prepare(work_dir, rows, **settings):
+    """Generate the extracts for `rows` merged rows unless the same ones are already there."""
+    data_dir = os.path.join(work_dir, f"rows_{rows}")
+    stamp = os.path.join(data_dir, "synth.json")
+    wanted = {"rows": rows, **settings}
+    if os.path.exists(stamp):
+        with open(stamp) as f:
+            if json.load(f) == wanted:
+                return data_dir
+    tera_synth.generate(data_dir, rows, **settings)
+    with open(stamp, "w") as f:
+        json.dump(wanted, f)
+    return data_dir
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, stages=STAGES, work_dir=".tera_bench", workers=None, **settings):
+    """Benchmark `stages` at every size; returns one result dict per (size, stage)."""
+    results = []
+    for rows in sizes:
+        data_dir = prepare(work_dir, rows, **settings)
+        for stage in stages:
+            result = {"size": rows, "stage": stage, **measure(stage, data_dir, workers)}
+            print(f"{rows:>11,} rows  {stage:<8} {result['seconds']:9.2f} s  "
+                  f"{result['rows_per_second'] or 0:13,.0f} rows/s  {result['peak_rss_mib']:9.1f} MiB peak")
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and dashboard on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="merged rows per run")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--work-dir", default=".tera_bench", help="where the synthetic extracts are kept")
+    parser.add_argument("--workers", type=int, default=None, help="pipeline worker processes")
+    parser.add_argument("--districts", type=int, default=3)
+    parser.add_argument("--duplicate-rate", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        # Child process started by measure()
+        print(json.dumps(run_stage(args.stage, os.path.abspath(args.data_dir), args.workers)))
+        return
+    results = run_benchmarks(args.sizes, args.stages, args.work_dir, args.workers,
+                             districts=args.districts, duplicate_rate=args.duplicate_rate, seed=args.seed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""Plotly figures for the Data Analysis page, memoized per filter selection."""
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+from tera_cube import load_cube
+from tera_data import DATA_FILE, dataset_version
+from tera_profile import timer
+from tera_trajectory import load_trajectories
+
+DISTRICT_COLORS = {
+    "Radnor": "darkorange",
+    "Westlake": "darkred",
+    "Kentwood": "darkgreen"
+}
+YEAR_COLORS = {
+    "2013": "steelblue",
+    "2014": "deepskyblue",
+    "2015": "dodgerblue"
+}
+GENDER_COLORS = {
+    "Female": "lightpink",
+    "Male": "lightblue",
+}
+RACE_COLORS = {
+    "White": px.colors.qualitative.Safe[0],
+    "Black": px.colors.qualitative.Alphabet[11],
+    "Hispanic": px.colors.qualitative.Plotly[2],
+    "Other": px.colors.qualitative.Plotly[0]
+}
+RACE_ORDER = ["White", "Black", "Hispanic", "Other"]
+
+# Figures kept across sessions; the least recently used are evicted first
+MAX_FIGURES = 256
+
+_figures = OrderedDict()  # (section, filters, path, version) -> figure(s)
+_figures_lock = threading.Lock()
+
+
+def cached_figure(build):
+    """Memoize `build(*filters, path=...)` on its section name, filters and dataset version.
+
+    The returned figures are shared between sessions and must not be modified.
+    """
+    @wraps(build)
+    def wrapper(*filters, path=DATA_FILE):
+        key = (build.__name__, filters, path, dataset_version(path))
+        with _figures_lock:
+            if key in _figures:
+                _figures.move_to_end(key)
+                return _figures[key]
+        with timer(f"figure.build:{build.__name__}"):
+            figure = build(*filters, path=path)
+        with _figures_lock:
+            _figures[key] = figure
+            while len(_figures) > MAX_FIGURES:
+                _figures.popitem(last=False)
+        return figure
+    return wrapper
+
+
+def _eval_pie(pie_data):
+    pie_data.columns = ['Evaluation', 'Count']
+    fig_pie = go.Figure(data=[go.Pie(labels=pie_data['Evaluation'], values=pie_data['Count'], hole=0.3)])
+    fig_pie.update_layout()
+    return fig_pie
+
+
+def _label_hist_axes(fig_hist):
+    fig_hist.update_xaxes(title_text="Count")
+    fig_hist.update_yaxes(title_text="Evaluation")
+    return fig_hist
+
+
+def _score_histogram(counts, **kwargs):
+    """Draw server-side score counts as horizontal bars that look like px.histogram(y="eval").
+
+    Only one bar per score and group reaches the browser, however many rows
+    the counts were taken from.
+    """
+    counts = counts[counts["count"] > 0]
+    fig_hist = px.bar(counts, x="count", y="eval", orientation='h', **kwargs)
+    fig_hist.update_layout(bargap=0)  # adjacent bins, as in a histogram
+    return _label_hist_axes(fig_hist)
+
+
+def _scope(district=None, year=None):
+    """Cube filters and a title suffix for an optional district and year."""
+    filters = {dim: value for dim, value in (("districtname", district), ("year", year)) if value is not None}
+    places = ([f"{district} District"] if district is not None else []) + ([str(year)] if year is not None else [])
+    return filters, "".join(f" in {place}" for place in places)
+
+
+########################################
+@cached_figure
+def overall_figures(path=DATA_FILE):
+    """Histogram and pie of all evaluation scores."""
+    cube = load_cube(path)
+    fig_hist = _score_histogram(cube.score_counts().reset_index(), title="Distribution of Evaluation Scores")
+    pie_data = cube.value_counts("eval").reset_index()
+    pie_data.columns = ['Evaluation', 'Count']
+    fig_pie = px.pie(pie_data, names='Evaluation', values='Count', hole=0.3)
+    return fig_hist, fig_pie
+
+
+########################################
+@cached_figure
+def district_figures(district, path=DATA_FILE):
+    """Histogram and pie of the scores in one district."""
+    cube = load_cube(path)
+    hist_color = DISTRICT_COLORS.get(district, "blue")
+    fig_hist = _score_histogram(cube.score_counts(districtname=district).reset_index(),
+                                title=f"Evaluation Score Distribution in {district} District",
+                                labels={"eval": "Evaluation"},
+                                color_discrete_sequence=[hist_color])
+    fig_pie = _eval_pie(cube.value_counts("eval", districtname=district).reset_index())
+    return fig_hist, fig_pie
+
+
+@cached_figure
+def district_average_figure(path=DATA_FILE):
+    """Average score per district."""
+    avg_eval_by_district = load_cube(path).mean(["districtname"])
+    district_fig = px.bar(avg_eval_by_district, x="districtname", y="eval",
+                          title="Average Evaluation Scores Across Districsts",
+                          labels={"eval": "Average Evaluation Score"},
+                          color="districtname",
+                          text_auto='.3s',
+                          color_discrete_map=DISTRICT_COLORS)
+    district_fig.update_yaxes(range=[avg_eval_by_district["eval"].min() - 0.25,
+                                     avg_eval_by_district["eval"].max() + 0.25])
+    district_fig.update_xaxes(title_text="District")
+    return district_fig
+
+
+@cached_figure
+def year_district_average_figure(path=DATA_FILE):
+    """Average score per year, grouped by district."""
+    avg_eval_by_year_district = load_cube(path).mean(["year", "districtname"])
+    return px.bar(
+        avg_eval_by_year_district,
+        x="year",
+        y="eval",
+        color="districtname",
+        title="Average Evaluation Scores by Each Year Across Districts",
+        labels={"eval": "Average Evaluation Score", "year": "Year", "districtname": "District"},
+        barmode="group",
+        text_auto='.3s',
+        color_discrete_map=DISTRICT_COLORS
+    )
+
+
+########################################
+@cached_figure
+def year_overlay_figure(district, path=DATA_FILE):
+    """Score histograms of one district, overlaid by year."""
+    return _score_histogram(load_cube(path).score_counts(["year"], districtname=district),
+                            title="Overlaid Evaluation Score Distribution by Year",
+                            labels={"eval": "Evaluation"},
+                            color="year",
+                            barmode='overlay',
+                            color_discrete_map=YEAR_COLORS)
+
+
+@cached_figure
+def year_figures(year, path=DATA_FILE):
+    """Histogram and pie of the scores in one year."""
+    cube = load_cube(path)
+    hist_color = YEAR_COLORS.get(year, "blue")
+    fig_hist = _score_histogram(cube.score_counts(year=year).reset_index(),
+                                title=f"Evaluation Score Distribution in year {year}",
+                                labels={"eval": "Evaluation"},
+                                color_discrete_sequence=[hist_color])
+    fig_pie = _eval_pie(cube.value_counts("eval", year=year).reset_index())
+    return fig_hist, fig_pie
+
+
+@cached_figure
+def year_average_figure(path=DATA_FILE):
+    """Average score per year."""
+    cube = load_cube(path)
+    avg_eval_by_year = cube.mean(["year"])
+    year_fig = px.bar(avg_eval_by_year, x="year", y="eval",
+                      title="Average Evaluation Scores by Year",
+                      color="year",
+                      text_auto='.3s',
+                      color_discrete_map=YEAR_COLORS)
+    # The upper bound follows the district averages so both charts share a scale
+    year_fig.update_yaxes(range=[avg_eval_by_year["eval"].min() - 0.25,
+                                 cube.mean(["districtname"])["eval"].max() + 0.25])
+    year_fig.update_xaxes(title_text="Year", dtick=1)
+    year_fig.update_yaxes(title_text="Average Evaluation Score")
+    return year_fig
+
+
+########################################
+@cached_figure
+def gender_figures(district=None, year=None, path=DATA_FILE):
+    """Score histograms overlaid by gender, and the gender split, optionally within a district and year."""
+    cube = load_cube(path)
+    filters, suffix = _scope(district, year)
+    fig_hist = _score_histogram(cube.score_counts(["gender_label"], **filters),
+                                title=f"Overlaid Evaluation Score Distribution by Gender{suffix}",
+                                labels={"eval": "Evaluation", "gender_label": "Gender"},
+                                color="gender_label",
+                                barmode='overlay',
+                                color_discrete_map=GENDER_COLORS)
+    pie_data = cube.value_counts("gender_label", **filters).reset_index()
+    pie_data.columns = ['Gender', 'Count']
+    fig_pie = px.pie(pie_data, values='Count', hole=0.3, color="Gender",
+                     color_discrete_map=GENDER_COLORS)
+    return fig_hist, fig_pie
+
+
+@cached_figure
+def gender_average_figure(district=None, year=None, path=DATA_FILE):
+    """Average score per gender, optionally within a district and year."""
+    filters, suffix = _scope(district, year)
+    avg_eval_by_gender = load_cube(path).mean(["gender_label"], **filters)
+    gender_fig = px.bar(avg_eval_by_gender, x="gender_label", y="eval",
+                        title=f"Average Evaluation Scores by Gender{suffix}",
+                        labels={"gender_label": "Gender"},
+                        color="gender_label",
+                        text_auto='.3s',
+                        color_discrete_map=GENDER_COLORS)
+    gender_fig.update_yaxes(range=[avg_eval_by_gender["eval"].min() - 0.25,
+                                   avg_eval_by_gender["eval"].max() + 0.25])
+    gender_fig.update_yaxes(title_text="Average Evaluation Score")
+    return gender_fig
+
+
+@cached_figure
+def year_gender_average_figure(path=DATA_FILE):
+    """Average score per year, grouped by gender."""
+    avg_eval_by_year_gender = load_cube(path).mean(["year", "gender_label"])
+    year_gender_fig = px.bar(
+        avg_eval_by_year_gender,
+        x="year",
+        y="eval",
+        color="gender_label",
+        title="Average Evaluation Scores by Gender in Three years",
+        labels={"eval": "Average Evaluation Score", "year": "Year", "gender_label": "Gender"},
+        barmode="group",
+        text_auto='.3s',
+        color_discrete_map=GENDER_COLORS
+    )
+    year_gender_fig.update_yaxes(range=[avg_eval_by_year_gender["eval"].min() - 0.25,
+                                        avg_eval_by_year_gender["eval"].max() + 0.25])
+    return year_gender_fig
+
+
+########################################
+@cached_figure
+def race_figures(district=None, year=None, path=DATA_FILE):
+    """Score histograms overlaid by race, and the race split, optionally within a district and year."""
+    cube = load_cube(path)
+    filters, suffix = _scope(district, year)
+    fig_hist = _score_histogram(cube.score_counts(["reth"], **filters),
+                                title=f"Overlaid Evaluation Score Distribution by Race{suffix}",
+                                labels={"eval": "Evaluation"},
+                                color="reth",
+                                barmode='overlay',
+                                color_discrete_map=RACE_COLORS)
+    pie_data = cube.value_counts("reth", **filters).reset_index()
+    pie_data.columns = ['Race', 'Count']
+    fig_pie = px.pie(pie_data, values='Count', hole=0.3, color="Race",
+                     color_discrete_map=RACE_COLORS)
+    return fig_hist, fig_pie
+
+
+@cached_figure
+def race_average_figure(district=None, year=None, path=DATA_FILE):
+    """Average score per race, optionally within a district and year."""
+    filters, suffix = _scope(district, year)
+    avg_eval_by_race = load_cube(path).mean(["reth"], **filters)
+    race_fig = px.bar(avg_eval_by_race, x="reth", y="eval",
+                      title=f"Average Evaluation Scores by Race{suffix}",
+                      labels={"race": "Race"},
+                      category_orders={"reth": RACE_ORDER},
+                      color="reth",
+                      text_auto='.3s',
+                      color_discrete_map=RACE_COLORS)
+    race_fig.update_yaxes(range=[avg_eval_by_race["eval"].min() - 0.25,
+                                 avg_eval_by_race["eval"].max() + 0.25])
+    race_fig.update_yaxes(title_text="Average Evaluation Score")
+    return race_fig
+
+
+@cached_figure
+def year_race_average_figure(path=DATA_FILE):
+    """Average score per year, grouped by race."""
+    avg_eval_by_year_race = load_cube(path).mean(["year", "reth"])
+    race_fig = px.bar(
+        avg_eval_by_year_race,
+        x="year",
+        y="eval",
+        color="reth",
+        title="Average Evaluation Scores by Race in Three years",
+        labels={"eval": "Average Evaluation Score", "year": "Year", "reth": "Race"},
+        barmode="group",
+        text_auto='.3s',
+        color_discrete_map=RACE_COLORS
+    )
+    race_fig.update_yaxes(range=[avg_eval_by_year_race["eval"].min() - 0.25,
+                                 avg_eval_by_year_race["eval"].max() + 0.25])
+    return race_fig
+
+
+########################################
+@cached_figure
+def district_race_figures(district, race, path=DATA_FILE):
+    """Gender-overlaid histogram and yearly averages for one district and race."""
+    cube = load_cube(path)
+    fig_hist = _score_histogram(
+        cube.score_counts(["gender_label"], districtname=district, reth=race),
+        title=f"Overlaid Evaluation Score Distribution by Gender in {district}",
+        labels={"eval": "Evaluation", "gender_label": "Gender"},
+        color="gender_label",
+        barmode='overlay',  # Overlaid bars
+        color_discrete_map=YEAR_COLORS
+    )
+
+    avg_eval_by_district_by_year = cube.mean(["districtname", "reth", "year"])
+    filtered_avg = avg_eval_by_district_by_year[(avg_eval_by_district_by_year["districtname"] == district)
+                                                & (avg_eval_by_district_by_year["reth"] == race)]
+    year_fig = px.bar(
+        filtered_avg,
+        x="year",
+        y="eval",
+        title=f"Average Evaluation Scores by Year in {district} with {race}",
+        color="year",
+        text_auto='.3s',
+        color_discrete_map=YEAR_COLORS
+    )
+    year_fig.update_yaxes(range=[avg_eval_by_district_by_year["eval"].min() - 0.25,
+                                 avg_eval_by_district_by_year["eval"].max() + 0.25])
+    year_fig.update_xaxes(title_text="Year", dtick=1)
+    year_fig.update_yaxes(title_text="Average Evaluation Score")
+    return fig_hist, year_fig
+
+
+########################################
+@cached_figure
+def score_change_figure(district=None, path=DATA_FILE):
+    """Year-over-year score changes of returning teachers, in one district or (None) all of them."""
+    changes = load_trajectories(path).score_changes(district=district)
+    change_fig = px.bar(
+        changes.reset_index(),
+        x="change",
+        y="teachers",
+        title=f"Score Change from One Year to the Next{f' in {district}' if district else ''}",
+        text_auto=True,
+    )
+    change_fig.update_xaxes(title_text="Score Change", dtick=1)
+    change_fig.update_yaxes(title_text="Teachers")
+    return change_fig
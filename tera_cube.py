@@ -0,0 +1,136 @@
+"""Precomputed district x year x gender x race aggregates for the dashboard."""
+import numpy as np
+import pandas as pd
+
+from tera_data import DATA_FILE, cached_by_version, load_analysis_frame
+from tera_profile import timed
+
+# Cube axes, in storage order
+DIMENSIONS = ["districtname", "year", "gender_label", "reth"]
+
+
+class AggregateCube:
+    """Per-cell row count, eval count/sum/sum-of-squares and per-score histogram.
+
+    Every chart query is answered by summing cells, so its cost depends on the
+    number of districts/years/groups and not on the number of rows loaded.
+    """
+
+    def __init__(self, levels, scores, rows, hist, total, total_sq):
+        self.levels = levels      # dimension -> list of labels, in first-appearance order
+        self.scores = scores      # sorted distinct eval values
+        self.rows = rows          # rows per cell, including rows without an eval
+        self.hist = hist          # rows per cell and eval score (last axis)
+        self.total = total        # sum of eval per cell
+        self.total_sq = total_sq  # sum of squared eval per cell
+
+    @classmethod
+    @timed("cube.build")
+    def from_frame(cls, frame):
+        """Build the cube from the analysis frame in one pass over its rows."""
+        levels, codes, shape = {}, [], []
+        for dim in DIMENSIONS:
+            values = frame[dim]
+            order = [v for v in pd.unique(values) if pd.notna(v)]
+            dim_codes = pd.Categorical(values, categories=order).codes.astype(np.int64)
+            # Missing labels (e.g. no reth) get their own trailing slot so the row
+            # still counts towards every roll-up that does not group by this column
+            dim_codes[dim_codes < 0] = len(order)
+            levels[dim] = order
+            codes.append(dim_codes)
+            shape.append(len(order) + 1)
+
+        cell = np.ravel_multi_index(codes, shape)
+        n_cells = int(np.prod(shape))
+        rows = np.bincount(cell, minlength=n_cells).reshape(shape)
+
+        evals = frame["eval"].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(evals)
+        cell, evals = cell[valid], evals[valid]
+        scores, score_idx = np.unique(evals, return_inverse=True)
+        hist = np.bincount(cell * len(scores) + score_idx, minlength=n_cells * len(scores))
+        total = np.bincount(cell, weights=evals, minlength=n_cells).reshape(shape)
+        total_sq = np.bincount(cell, weights=evals * evals, minlength=n_cells).reshape(shape)
+        return cls(levels, scores, rows, hist.reshape(shape + [len(scores)]), total, total_sq)
+
+    def options(self, dim):
+        """Return the labels of `dim` in the order they first appear in the data."""
+        return list(self.levels[dim])
+
+    def _rollup(self, array, by, filters):
+        """Sum `array` over every dimension not in `by`, after applying the label `filters`.
+
+        Returns the rolled-up array with the `by` axes first (in `by` order) and
+        the index of group labels matching them.
+        """
+        index = [np.arange(n) for n in array.shape]
+        labels = {}
+        for axis, dim in enumerate(DIMENSIONS):
+            if dim in filters:
+                value = filters[dim]
+                found = value in self.levels[dim]
+                index[axis] = np.array([self.levels[dim].index(value)] if found else [], dtype=np.intp)
+                labels[dim] = [value] if found else []
+            elif dim in by:
+                # Grouping drops the missing-label slot, as pandas groupby does
+                index[axis] = np.arange(len(self.levels[dim]))
+                labels[dim] = self.levels[dim]
+        array = array[np.ix_(*index)]
+        kept = [dim for dim in DIMENSIONS if dim in by]
+        array = array.sum(axis=tuple(axis for axis, dim in enumerate(DIMENSIONS) if dim not in by))
+        order = [kept.index(dim) for dim in by] + list(range(len(by), array.ndim))
+        group_index = pd.MultiIndex.from_product([labels[dim] for dim in by], names=by) if by else None
+        return array.transpose(order), group_index
+
+    def histogram_array(self, by=(), **filters):
+        """Return per-score counts rolled up to `by` as an array shaped (*groups, scores), and its group index."""
+        return self._rollup(self.hist, list(by), filters)
+
+    def aggregate(self, by=(), **filters):
+        """Return count, sum, mean and std of eval per `by` group, like a groupby over the rows."""
+        by = list(by)
+        hist, group_index = self._rollup(self.hist, by, filters)
+        count = hist.sum(axis=-1)
+        total = self._rollup(self.total, by, filters)[0]
+        total_sq = self._rollup(self.total_sq, by, filters)[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            var = (total_sq - count * mean * mean) / (count - 1)
+        result = pd.DataFrame({
+            "count": np.ravel(count),
+            "sum": np.ravel(total),
+            "mean": np.ravel(mean),
+            "std": np.sqrt(np.clip(np.ravel(var), 0, None)),
+        }, index=group_index)
+        result = result[result["count"] > 0]
+        return result.sort_index().reset_index() if by else result
+
+    def mean(self, by, **filters):
+        """Return average eval per `by` group, shaped like `groupby(by)["eval"].mean().reset_index()`."""
+        result = self.aggregate(by, **filters)
+        return result[list(by) + ["mean"]].rename(columns={"mean": "eval"})
+
+    def score_counts(self, by=(), **filters):
+        """Return the number of rows per eval score, optionally split by the `by` groups."""
+        by = list(by)
+        hist, group_index = self._rollup(self.hist, by, filters)
+        if not by:
+            return pd.Series(hist, index=pd.Index(self.scores, name="eval"), name="count")
+        counts = pd.DataFrame(hist.reshape(-1, len(self.scores)), index=group_index,
+                              columns=pd.Index(self.scores, name="eval"))
+        return counts.stack().rename("count").reset_index()
+
+    def value_counts(self, dim, **filters):
+        """Return row counts per label of `dim` (or per score for "eval"), largest first."""
+        if dim == "eval":
+            counts = self.score_counts(**filters)
+        else:
+            rows, group_index = self._rollup(self.rows, [dim], filters)
+            counts = pd.Series(rows, index=group_index.get_level_values(0), name="count")
+        counts = counts[counts > 0]
+        return counts.sort_values(ascending=False, kind="stable")
+
+
+def load_cube(path=DATA_FILE):
+    """Return the aggregate cube for the current version of `path`, built once per process."""
+    return cached_by_version(path, "cube", lambda p: AggregateCube.from_frame(load_analysis_frame(p)))
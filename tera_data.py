@@ -0,0 +1,263 @@
+"""Cached, typed loading of the merged teacher evaluation datasets."""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tera_profile import timed
+
+# Copy-on-write makes shallow copies safe to hand out; it is always on from pandas 3.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Arrow IPC is memory-mapped on load; all.csv is kept as the text export
+DATA_FILE = "all.arrow"
+# Datasets the dashboard serves, as {"display name": "path"}; relative paths start at the file
+REGISTRY_FILE = os.environ.get("TERA_DATASETS", "datasets.json")
+# Derived per-row arrays shared by every process, next to each dataset
+STORE_DIR = ".tera_store"
+
+# Column types applied while parsing, so no per-rerun conversion is needed
+DTYPES = {
+    "id": "int32",
+    "districtname": "category",
+    "reth": "category",
+    "year": "category",
+    "female": "int8",
+    "eval": "float32",
+}
+
+# Clean column set of the merged dataset; the _x/_y merge leftovers are dropped
+COLUMNS = ["id", "year", "districtname", "female", "reth", "eval"]
+# Columns the dashboard reads
+ANALYSIS_COLUMNS = COLUMNS
+GENDER_LABELS = ["Male", "Female"]  # indexed by the 0/1 `female` code
+
+_load_lock = threading.RLock()  # guards _frames and _build_locks, never held while building
+_frames = {}  # (path, kind) -> (version, object)
+_build_locks = {}  # (path, kind) -> lock held while that entry is built
+
+
+def dataset_version(path=DATA_FILE):
+    """Return a token that changes whenever the file at `path` is rewritten."""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def load_registry(path=REGISTRY_FILE):
+    """Return {display name: dataset path}; without a registry file, only the default dataset."""
+    if not os.path.exists(path):
+        return {"Teacher evaluations": DATA_FILE}
+    with open(path) as f:
+        datasets = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    return {name: os.path.join(base, file_name) for name, file_name in datasets.items()}
+
+
+def _mapped_frame(table):
+    """Wrap a memory-mapped table as a DataFrame, without copying the columns that allow it.
+
+    Numeric columns without nulls and the codes of dictionary columns without
+    nulls (Series.array.codes) stay read-only views on the map, so every
+    process reading the file shares the same pages. Other columns are copied.
+    Note that pandas' `.cat.codes` accessor returns a new copy on every call.
+    """
+    columns = {}
+    for name in table.column_names:
+        chunked = table[name]
+        if chunked.num_chunks != 1:
+            columns[name] = chunked.to_pandas()
+            continue
+        array = chunked.chunk(0)
+        if pa.types.is_dictionary(array.type):
+            indices = array.indices.fill_null(-1) if array.null_count else array.indices
+            categories = pd.Index(array.dictionary.to_pandas())
+            columns[name] = pd.Categorical.from_codes(indices.to_numpy(), categories, validate=False)
+        elif array.null_count == 0 and (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+            columns[name] = array.to_numpy(zero_copy_only=True)
+        else:
+            columns[name] = chunked.to_pandas()
+    return pd.DataFrame(columns, copy=False)
+
+
+@timed("data.read")
+def read_dataset(path, columns=None):
+    """Read the merged dataset from CSV, Parquet or Arrow IPC, loading only `columns`."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path, usecols=columns, dtype=DTYPES)
+    if ext == ".parquet":
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    # Memory-mapped: columns that are not selected are never paged in
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return _mapped_frame(table)
+
+
+def nan_as_value(table, frame):
+    """Store the float columns of `frame` in `table` with NaN values instead of nulls.
+
+    Without a validity bitmap the column can be mapped without copying.
+    """
+    for name in frame.select_dtypes("float").columns:
+        index = table.schema.get_field_index(name)
+        table = table.set_column(index, table.schema.field(index),
+                                 pa.array(frame[name].to_numpy(), type=table.schema.field(index).type))
+    return table
+
+
+def to_table(frame):
+    """Convert a merged frame to an Arrow table with the clean column set and dtypes."""
+    # Years are labels on the dashboard, so they are stored as strings
+    frame = frame[COLUMNS].astype({"year": str}).astype(DTYPES)
+    for column_name in frame.select_dtypes("category"):
+        # Sorted dictionaries keep the file identical however the rows were built
+        frame[column_name] = frame[column_name].cat.reorder_categories(sorted(frame[column_name].cat.categories))
+    # Categories become dictionary-encoded columns
+    return nan_as_value(pa.Table.from_pandas(frame, preserve_index=False), frame)
+
+
+@contextmanager
+def replacing(path):
+    """Yield a temporary path next to `path`, renamed over `path` once the block succeeds.
+
+    Dashboard processes map datasets without copying; rewriting the file in
+    place would truncate the pages under them (SIGBUS). After the rename they
+    keep reading the old file until they reload the new version.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    temp = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def write_dataset(frame, path):
+    """Write `frame` as Parquet or (by default) uncompressed Arrow IPC, based on the extension."""
+    table = to_table(frame)
+    with replacing(path) as temp:
+        if os.path.splitext(path)[1].lower() == ".parquet":
+            pq.write_table(table, temp)
+        else:
+            with pa.OSFile(temp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+@timed("data.normalize")
+def _build_analysis(path):
+    """Normalize the typed dataset once for every chart section."""
+    frame = read_dataset(path, ANALYSIS_COLUMNS)
+    # Codes are the mapped `female` column; assigning a Series (not a Categorical) keeps them shared.
+    # Values other than 0/1 (reported by the pipeline's quality checks) have no label.
+    female = frame["female"].to_numpy()
+    valid = (female >= 0) & (female < len(GENDER_LABELS))
+    codes = female if valid.all() else np.where(valid, female, -1).astype(female.dtype)
+    labels = pd.Categorical.from_codes(codes, GENDER_LABELS)
+    frame["gender_label"] = pd.Series(labels, index=frame.index, copy=False)
+    return frame
+
+
+def cached_by_version(path, kind, build):
+    """Return `build(path)`, built once per version of `path` and shared by every caller.
+
+    Only callers of the same (path, kind) wait while it is built; other
+    entries and datasets are served meanwhile.
+    """
+    version = dataset_version(path)
+    key = (path, kind)
+    with _load_lock:
+        cached = _frames.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        build_lock = _build_locks.setdefault(key, threading.RLock())
+    with build_lock:
+        with _load_lock:
+            cached = _frames.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, build(path))
+            with _load_lock:
+                # Replacing the entry drops the stale object once no session holds it
+                _frames[key] = cached
+    return cached[1]
+
+
+def cache_entries(path, kinds):
+    """Return the cached `kinds` of `path` with their versions, e.g. to hand them to worker processes."""
+    with _load_lock:
+        return {kind: _frames[(path, kind)] for kind in kinds if (path, kind) in _frames}
+
+
+def seed_cache(path, entries):
+    """Install entries from cache_entries(); they are used while the file version still matches."""
+    with _load_lock:
+        for kind, cached in entries.items():
+            _frames[(path, kind)] = cached
+
+
+def shared_arrays(path, kind, build):
+    """Return the arrays of `build(path)` ({name: array}), built once per dataset version for all processes.
+
+    The first process to need them saves them as .npy files in STORE_DIR next
+    to the dataset; every process then maps those read-only, so they take
+    memory once per dataset rather than once per process. When the dataset's
+    directory is read-only the store is kept in the temp directory, and when
+    that fails too the arrays are built in memory.
+    """
+    def load(path):
+        digest = hashlib.sha256(dataset_version(path).encode()).hexdigest()[:16]
+        dataset_dir = os.path.dirname(os.path.abspath(path))
+        fallback = os.path.join(tempfile.gettempdir(), "tera_store",
+                                hashlib.sha256(dataset_dir.encode()).hexdigest()[:16])
+        prefix = f"{os.path.basename(path)}.{kind}."
+        for store in (os.path.join(dataset_dir, STORE_DIR), fallback):
+            directory = os.path.join(store, prefix + digest)
+            if os.path.isdir(directory):
+                break
+            try:
+                os.makedirs(store, exist_ok=True)
+                staging = tempfile.mkdtemp(dir=store)
+            except OSError:
+                continue
+            for name, array in build(path).items():
+                np.save(os.path.join(staging, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                shutil.rmtree(staging)  # another process saved the same version first
+            for stale in os.listdir(store):
+                if stale.startswith(prefix) and stale != prefix + digest:
+                    shutil.rmtree(os.path.join(store, stale), ignore_errors=True)
+            break
+        else:
+            return build(path)
+        return {
+            file_name[:-4]: np.load(os.path.join(directory, file_name), mmap_mode="r")
+            for file_name in os.listdir(directory) if file_name.endswith(".npy")
+        }
+    return cached_by_version(path, f"shared:{kind}", load)
+
+
+def load_analysis_frame(path=DATA_FILE):
+    """Return a read-only view of the normalized frame used by the Data Analysis page."""
+    return cached_by_version(path, "analysis", _build_analysis).copy(deep=False)
+
+
+if __name__ == "__main__":
+    # Convert a merged CSV export, e.g. `python tera_data.py all.csv all.arrow`
+    source, target = sys.argv[1:3] if len(sys.argv) > 2 else ("all.csv", DATA_FILE)
+    write_dataset(read_dataset(source, COLUMNS), target)
+    print(f"Dataset saved as {target}")
@@ -0,0 +1,319 @@
+"""Headless export of the Data Analysis page as static HTML and PDF reports.
+
+One report is written per district, per year and per district x race (plus
+an overview with every section), from the same figure and narrative code the
+dashboard uses. District and year reports break their scores down by gender
+and race within that district or year; the written narratives cover the
+whole dataset, so only the overview and district x race reports carry them. The cube, narratives and association statistics are built
+once in this process and handed to the worker processes, which only draw
+and write files.
+
+    python tera_export.py --out-dir reports --format html pdf --workers 8
+
+HTML reports keep the interactive Plotly figures and load plotly.js from a
+single copy in --out-dir. PDF reports (fpdf) draw the score distribution
+and average scores as bars, since static rendering of Plotly figures needs
+kaleido.
+"""
+import argparse
+import html
+import os
+import re
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+from plotly.offline import get_plotlyjs
+
+import tera_charts
+import tera_insights
+import tera_stats
+from tera_cube import load_cube
+from tera_data import DATA_FILE, cache_entries, seed_cache
+
+REPORT_KINDS = ["overview", "district", "year", "district_race"]
+FORMATS = ["html", "pdf"]
+PLOTLY_JS = "plotly.min.js"
+# Cached objects the reports read; built once and shared with every worker
+SHARED_KINDS = ["cube", "insights"] + [f"association:{dim}" for dim in tera_stats.DEMOGRAPHICS]
+
+
+def _slug(label):
+    return re.sub(r"[^\w.-]+", "_", str(label)).strip("_")
+
+
+def _summary(cube, **filters):
+    """One line with the number of scored records and their average, for a filtered report."""
+    result = cube.aggregate((), **filters)
+    if result.empty:
+        return "No scored records."
+    row = result.iloc[0]
+    return f"**{int(row['count']):,}** scored records with an average score of **{row['mean']:.2f}**."
+
+
+def _group_means(cube, by, label, **filters):
+    """One line with the average score of each `by` group, for a filtered report."""
+    means = cube.aggregate([by], **filters)
+    averages = ", ".join(f"{group} **{mean:.2f}**" for group, mean in zip(means[by], means["mean"]))
+    return f"Average score by {label}: {averages}." if averages else "No scored records."
+
+
+def _demographic_sections(cube, district=None, year=None, path=DATA_FILE):
+    """Gender and race sections rolled up within a district and/or year."""
+    filters = {dim: value for dim, value in (("districtname", district), ("year", year)) if value is not None}
+    return [
+        ("Evaluation Scores by Gender",
+         [*tera_charts.gender_figures(district, year, path=path),
+          tera_charts.gender_average_figure(district, year, path=path)],
+         [_group_means(cube, "gender_label", "gender", **filters)], filters, "gender_label"),
+        ("Evaluation Scores by Race",
+         [*tera_charts.race_figures(district, year, path=path),
+          tera_charts.race_average_figure(district, year, path=path)],
+         [_group_means(cube, "reth", "race", **filters)], filters, "reth"),
+    ]
+
+
+def _cramers_v(dim, label, path):
+    return f"Cramer's V between {label} and Evaluation: **{tera_stats.association(dim, path)['cramers_v']:.4f}**"
+
+
+def build_report(kind, key, path=DATA_FILE):
+    """Return the title and sections of one report.
+
+    Each section has a heading, figures, markdown paragraphs and the cube
+    `filters` and `by` dimension its PDF bars are drawn from.
+    """
+    cube = load_cube(path)
+    if kind == "overview":
+        title = "Teacher Evaluation Report"
+        sections = [
+            ("Overall Distribution of Evaluation Scores", tera_charts.overall_figures(path=path),
+             [tera_insights.narrative("overall", path)], {}, "eval"),
+            ("Evaluation Scores by District",
+             [tera_charts.district_average_figure(path=path), tera_charts.year_district_average_figure(path=path)],
+             [tera_insights.narrative("district", path)], {}, "districtname"),
+            ("Evaluation Scores Across Years", [tera_charts.year_average_figure(path=path)],
+             [tera_insights.narrative("year", path)], {}, "year"),
+            ("Evaluation Scores by Gender",
+             [*tera_charts.gender_figures(path=path), tera_charts.gender_average_figure(path=path),
+              tera_charts.year_gender_average_figure(path=path)],
+             [_cramers_v("gender_label", "Gender", path), tera_insights.narrative("gender", path)], {}, "gender_label"),
+            ("Evaluation Scores by Race",
+             [*tera_charts.race_figures(path=path), tera_charts.race_average_figure(path=path),
+              tera_charts.year_race_average_figure(path=path)],
+             [_cramers_v("reth", "Race", path), tera_insights.narrative("race", path)], {}, "reth"),
+        ]
+    elif kind == "district":
+        (district,) = key
+        title = f"{district} District"
+        sections = [
+            ("Evaluation Score Distribution",
+             [*tera_charts.district_figures(district, path=path), tera_charts.year_overlay_figure(district, path=path)],
+             [_summary(cube, districtname=district)], {"districtname": district}, "year"),
+            *_demographic_sections(cube, district=district, path=path),
+        ]
+    elif kind == "year":
+        (year,) = key
+        title = f"Evaluation Scores in {year}"
+        sections = [
+            ("Evaluation Score Distribution", tera_charts.year_figures(year, path=path),
+             [_summary(cube, year=year)], {"year": year}, "districtname"),
+            *_demographic_sections(cube, year=year, path=path),
+        ]
+    elif kind == "district_race":
+        district, race = key
+        title = f"{race} Teachers in {district} District"
+        sections = [
+            ("Evaluation Scores by Gender and Year", tera_charts.district_race_figures(district, race, path=path),
+             [_summary(cube, districtname=district, reth=race),
+              tera_insights.narrative("district_race", path, race=race)],
+             {"districtname": district, "reth": race}, "year"),
+        ]
+    else:
+        raise ValueError(f"unknown report kind {kind!r}")
+    keys = ("heading", "figures", "markdown", "filters", "by")
+    return {"title": title, "sections": [dict(zip(keys, section)) for section in sections]}
+
+
+def report_jobs(kinds=REPORT_KINDS, path=DATA_FILE):
+    """Return (kind, key, file stem) for every report of `kinds`; empty district x race pairs are skipped."""
+    cube = load_cube(path)
+    districts, years, races = cube.options("districtname"), sorted(cube.options("year")), cube.options("reth")
+    jobs = []
+    if "overview" in kinds:
+        jobs.append(("overview", (), "overview"))
+    if "district" in kinds:
+        jobs += [("district", (d,), f"district/{_slug(d)}") for d in districts]
+    if "year" in kinds:
+        jobs += [("year", (y,), f"year/{_slug(y)}") for y in years]
+    if "district_race" in kinds:
+        counts = cube.aggregate(["districtname", "reth"])
+        present = set(zip(counts["districtname"], counts["reth"]))
+        jobs += [("district_race", (d, r), f"district_race/{_slug(d)}__{_slug(r)}")
+                 for d in districts for r in races if (d, r) in present]
+    return jobs
+
+
+def markdown_html(text):
+    """Convert the narrow markdown the narratives use (headings, bullets, bold, code) to HTML."""
+    out, in_list = [], False
+    for line in textwrap.dedent(text).strip().splitlines():
+        line = line.strip()
+        inline = html.escape(line.lstrip("#- ").strip())
+        inline = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", inline)
+        inline = re.sub(r"`(.+?)`", r"<code>\1</code>", inline)
+        if line.startswith("- ") != in_list:
+            out.append("<ul>" if not in_list else "</ul>")
+            in_list = not in_list
+        if line.startswith("#"):
+            level = min(len(line) - len(line.lstrip("#")), 6)
+            out.append(f"<h{level}>{inline}</h{level}>")
+        elif line.startswith("- "):
+            out.append(f"<li>{inline}</li>")
+        elif line:
+            out.append(f"<p>{inline}</p>")
+    if in_list:
+        out.append("</ul>")
+    return "\n".join(out)
+
+
+def write_html(report, file_name, plotly_js):
+    parts = [
+        "<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\">",
+        f"<title>{html.escape(report['title'])}</title>",
+        f"<script src=\"{plotly_js}\"></script>",
+        "<style>body{font-family:sans-serif;max-width:1100px;margin:auto}</style>",
+        "</head><body>", f"<h1>{html.escape(report['title'])}</h1>",
+    ]
+    for section in report["sections"]:
+        parts.append(f"<h2>{html.escape(section['heading'])}</h2>")
+        parts += [markdown_html(text) for text in section["markdown"]]
+        parts += [figure.to_html(full_html=False, include_plotlyjs=False) for figure in section["figures"]]
+    parts.append("</body></html>")
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+
+def _latin1(text):
+    """fpdf's core fonts only cover latin-1."""
+    text = text.replace("→", "->").replace("×", "x")
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _pdf_bars(pdf, title, labels, values, fmt):
+    """Draw one labelled horizontal bar per value."""
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(0, 7, _latin1(title), ln=1)
+    pdf.set_font("Arial", "", 9)
+    top = max(values, default=0) or 1
+    for label, value in zip(labels, values):
+        pdf.cell(35, 5, _latin1(str(label)))
+        x, y = pdf.get_x(), pdf.get_y()
+        pdf.set_fill_color(70, 130, 180)
+        pdf.rect(x, y + 1, 110 * value / top, 3, "F")
+        pdf.set_x(x + 115)
+        pdf.cell(0, 5, fmt.format(value), ln=1)
+    pdf.ln(2)
+
+
+def write_pdf(report, file_name, path=DATA_FILE):
+    cube = load_cube(path)
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, _latin1(report["title"]), ln=1)
+    for section in report["sections"]:
+        pdf.set_font("Arial", "B", 13)
+        pdf.cell(0, 9, _latin1(section["heading"]), ln=1)
+        for text in section["markdown"]:
+            for line in textwrap.dedent(text).strip().splitlines():
+                line = line.strip().replace("**", "").replace("`", "")
+                if line.startswith("#"):
+                    pdf.set_font("Arial", "B", 11)
+                    line = line.lstrip("# ")
+                else:
+                    pdf.set_font("Arial", "", 10)
+                if line:
+                    pdf.multi_cell(0, 5, _latin1(line))
+        pdf.ln(2)
+        filters, by = section["filters"], section["by"]
+        counts = cube.score_counts(**filters)
+        _pdf_bars(pdf, "Evaluation score counts", [f"{s:g}" for s in counts.index], counts.tolist(), "{:,.0f}")
+        if by != "eval":
+            means = cube.aggregate([by], **filters)
+            _pdf_bars(pdf, f"Average score by {by}", means[by].tolist(), means["mean"].tolist(), "{:.2f}")
+    pdf.output(file_name)
+
+
+def render_report(kind, key, stem, out_dir, formats=FORMATS, path=DATA_FILE):
+    """Write one report in every format; runs in a worker process. Returns the files written."""
+    report = build_report(kind, key, path)
+    written = []
+    base = os.path.join(out_dir, stem)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    if "html" in formats:
+        plotly_js = os.path.relpath(os.path.join(out_dir, PLOTLY_JS), os.path.dirname(base))
+        write_html(report, base + ".html", plotly_js.replace(os.sep, "/"))
+        written.append(base + ".html")
+    if "pdf" in formats:
+        write_pdf(report, base + ".pdf", path)
+        written.append(base + ".pdf")
+    return written
+
+
+def write_index(jobs, out_dir, formats):
+    """Link every report from out_dir/index.html."""
+    items = []
+    for kind, key, stem in jobs:
+        label = html.escape(" / ".join(key) or "Overview")
+        links = " ".join(f'<a href="{stem}.{fmt}">{fmt.upper()}</a>' for fmt in formats)
+        items.append(f"<li>{html.escape(kind)}: {label} {links}</li>")
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Reports</title></head><body>"
+                "<h1>Teacher Evaluation Reports</h1><ul>\n" + "\n".join(items) + "\n</ul></body></html>")
+
+
+def run_export(out_dir="reports", formats=FORMATS, kinds=REPORT_KINDS, workers=None, path=DATA_FILE):
+    """Export every report of `kinds` to `out_dir`; returns the files written."""
+    start = time.perf_counter()
+    # Shared aggregates: built once here, copied to each worker once
+    load_cube(path)
+    tera_insights.insights(path)
+    for dim in tera_stats.DEMOGRAPHICS:
+        tera_stats.association(dim, path)
+    entries = cache_entries(path, SHARED_KINDS)
+
+    os.makedirs(out_dir, exist_ok=True)
+    if "html" in formats:
+        with open(os.path.join(out_dir, PLOTLY_JS), "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+    jobs = report_jobs(kinds, path)
+    args = [[job[i] for job in jobs] for i in range(3)]
+    extra = [[out_dir] * len(jobs), [formats] * len(jobs), [path] * len(jobs)]
+    if workers == 1 or len(jobs) < 2:
+        results = map(render_report, *args, *extra)
+        written = [name for names in results for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=seed_cache, initargs=(path, entries)) as pool:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            written = [name for names in pool.map(render_report, *args, *extra, chunksize=chunksize) for name in names]
+    write_index(jobs, out_dir, formats)
+    print(f"Wrote {len(written)} files for {len(jobs)} reports to {out_dir} "
+          f"in {time.perf_counter() - start:.1f} s")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Data Analysis page as static reports.")
+    parser.add_argument("--data", default=DATA_FILE, help="merged dataset to report on")
+    parser.add_argument("--out-dir", default="reports")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=FORMATS, dest="formats")
+    parser.add_argument("--kinds", nargs="+", choices=REPORT_KINDS, default=REPORT_KINDS)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    args = parser.parse_args(argv)
+    run_export(args.out_dir, args.formats, args.kinds, args.workers, args.data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Headline figures of the Data Analysis narratives, computed from the aggregate cube.
+
+Every number quoted on the page (modes, extremes, year-over-year changes,
+group shares) is derived once per dataset version from the cube's counts
+and sums, without touching the rows, and filled into the markdown templates
+below. A template line whose facts are missing (a cohort with a single
+score, race or year, or no scores at all) is left out.
+"""
+import numpy as np
+
+from tera_cube import load_cube
+from tera_data import DATA_FILE, cached_by_version
+
+# Averages closer than this are reported as "very little difference"
+SIMILAR_MEANS = 0.05
+
+TEMPLATES = {
+    "overall": """
+    ###### **Evaluation Score Distribution**
+
+    - {no_scores}
+    - The most common evaluation score is **{top_score}**, accounting for **{top_count:,}** instances (**{top_share:.1%}** of all scored records).
+    - The second most common score is **{second_score}**, with **{second_count:,}** instances (**{second_share:.1%}** of all scored records).
+    """,
+    "district": """
+    ###### **Evaluation Score Trends by District**
+
+    - {no_scores}
+    - The most common score is {district_modes}.
+    - **{best_district}** has the highest overall average score (**{best_district_mean:.2f}**), whereas **{worst_district}** has the lowest (**{worst_district_mean:.2f}**) over the {year_count}-year period.
+    - In **{last_year}**, **{best_last}** recorded the highest average score (**{best_last_mean:.2f}**), while **{worst_last}** had the lowest (**{worst_last_mean:.2f}**) among the {district_count} districts.
+    - From **{first_year} to {last_year}**, the average score {district_trends}.
+    """,
+    "year": """
+    ###### **Evaluation Score Trends by Year**
+
+    - {no_scores}
+{year_score_lines}
+    - The highest average score occurred in **{best_year}**, with an average of **{best_year_mean:.2f}**.
+    - The lowest average score was observed in **{worst_year}**, with an average of **{worst_year_mean:.2f}**.
+    """,
+    "gender": """
+    ###### **Evaluation Scores by Gender**
+
+    - The number of **female** participants(contain repeat) is {female_vs_male} that of **male** participants, with **{female_count:,}** females (representing **{female_share:.1%}**) and **{male_count:,}** males (representing **{male_share:.1%}**).
+    - {gender_means}
+    - {only_gender_mean}
+    """,
+    "race": """
+    ###### **Evaluation Scores by Race**
+
+    - **{largest_race}** teachers represent **{largest_race_share:.1%}** of the total, with **{largest_race_count:,}** instances.
+    - The second-largest group is **{second_race}**, comprising **{second_race_share:.1%}** of the total, with **{second_race_count:,}** instances.
+    - **{best_race}** teachers have the highest average score of **{best_race_mean:.2f}**, followed by **{next_race}** teachers with an average score of **{next_race_mean:.2f}**.
+    - **{only_race}** teachers have an average score of **{only_race_mean:.2f}**.
+    """,
+    "district_race": """
+    ###### **Evaluation Scores of {race} Teachers by District and Year**
+
+{district_race_blocks}
+    """,
+}
+
+
+def _join(items):
+    """'a', 'a and b', 'a, b and c'."""
+    items = list(items)
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _label(score):
+    return f"{score:g}"
+
+
+def _extremes(means):
+    """Return (label, mean) of the highest and of the lowest entry of a label -> mean dict (None if empty)."""
+    ranked = sorted(means.items(), key=lambda item: item[1])
+    return (ranked[-1], ranked[0]) if ranked else None
+
+
+def _fill(template, facts):
+    """Format `template` line by line, leaving out the lines that use a missing fact."""
+    lines = []
+    for line in template.split("\n"):
+        try:
+            lines.append(line.format(**facts))
+        except KeyError:
+            pass
+    return "\n".join(lines)
+
+
+def _means(cube, by, **filters):
+    aggregate = cube.aggregate(by, **filters)
+    return dict(zip(aggregate[by[0]].astype(str), aggregate["mean"]))
+
+
+def _district_race_block(cube, race, districts, years):
+    lines = []
+    for number, district in enumerate(districts, start=1):
+        means = _means(cube, ["year"], districtname=district, reth=race)
+        lines.append(f"    **{number}. {district} District**:  ")
+        if means:
+            (best, best_mean), (worst, worst_mean) = _extremes(means)
+            lines.append(f"    - Highest average score: **{best_mean:.2f}** ({best})  ")
+            lines.append(f"    - Lowest average score: **{worst_mean:.2f}** ({worst})  ")
+        else:
+            lines.append(f"    - No scored {race} teachers in {_join(years)}  ")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def compute_insights(cube):
+    """Return the template fields of every narrative, from the cube's aggregates only.
+
+    Facts that need more data than the cube has (a second score, a second
+    race, scored rows in the first and last year) are left out.
+    """
+    facts = {section: {} for section in TEMPLATES}
+    scores = cube.value_counts("eval")
+    scored = scores.sum()
+    if not scored:
+        for section in ("overall", "district", "year"):
+            facts[section]["no_scores"] = "No scored records in this dataset."
+
+    # Overall: the two most common scores
+    for rank, (score, count) in zip(("top", "second"), scores.items()):
+        facts["overall"].update({
+            f"{rank}_score": _label(score), f"{rank}_count": int(count), f"{rank}_share": count / scored,
+        })
+
+    # Districts: modal score, averages overall and in the last year, first-to-last-year change
+    districts = list(cube.value_counts("districtname").index.astype(str))  # largest first
+    years = sorted(cube.options("year"))
+    hist, index = cube.histogram_array(["districtname"])
+    modes = {}
+    for district, counts in zip(index.get_level_values(0), hist):
+        if counts.any():
+            modes.setdefault(_label(cube.scores[np.argmax(counts)]), []).append(f"**{district}**")
+    district_facts = facts["district"]
+    district_facts.update({"year_count": len(years), "district_count": len(districts)})
+    if modes:
+        district_facts["district_modes"] = ", and ".join(
+            f"**{score}** in {_join(names)}" for score, names in modes.items()
+        )
+    extremes = _extremes(_means(cube, ["districtname"]))
+    if extremes:
+        (best, best_mean), (worst, worst_mean) = extremes
+        district_facts.update({"best_district": best, "best_district_mean": best_mean,
+                               "worst_district": worst, "worst_district_mean": worst_mean})
+    if years:
+        last_means = _means(cube, ["districtname"], year=years[-1])
+        first_means = _means(cube, ["districtname"], year=years[0])
+        district_facts.update({"first_year": years[0], "last_year": years[-1]})
+        extremes = _extremes(last_means)
+        if extremes:
+            (best_last, best_last_mean), (worst_last, worst_last_mean) = extremes
+            district_facts.update({"best_last": best_last, "best_last_mean": best_last_mean,
+                                   "worst_last": worst_last, "worst_last_mean": worst_last_mean})
+        trends = {}
+        for district in districts if len(years) > 1 else []:
+            if district in first_means and district in last_means:
+                change = last_means[district] - first_means[district]
+                direction = "increased" if change > 0 else "declined" if change < 0 else "stayed the same"
+                trends.setdefault(direction, []).append(
+                    f"in **{district}** ({first_means[district]:.2f} → {last_means[district]:.2f})"
+                )
+        if trends:
+            district_facts["district_trends"] = ", and ".join(
+                f"{direction} {_join(items)}" for direction, items in trends.items()
+            )
+
+    # Years: the year with the most of each score, best and worst yearly averages
+    hist, index = cube.histogram_array(["year"])
+    year_labels = list(index.get_level_values(0))
+    lines = []
+    for column in range(len(cube.scores) - 1, -1, -1):
+        peak = int(np.argmax(hist[:, column]))
+        lines.append(f"    - **{year_labels[peak]}** recorded the highest number of **{_label(cube.scores[column])}** "
+                     f"scores among the {len(years)} years, with a total of **{int(hist[peak, column]):,}** instances.  ")
+    facts["year"]["year_score_lines"] = "\n".join(lines)
+    extremes = _extremes(_means(cube, ["year"]))
+    if extremes:
+        (best_year, best_year_mean), (worst_year, worst_year_mean) = extremes
+        facts["year"].update({"best_year": best_year, "best_year_mean": best_year_mean,
+                              "worst_year": worst_year, "worst_year_mean": worst_year_mean})
+
+    # Gender: row counts and shares, averages
+    genders = cube.value_counts("gender_label")
+    female, male = int(genders.get("Female", 0)), int(genders.get("Male", 0))
+    facts["gender"].update({
+        "female_vs_male": "higher than" if female > male else "lower than" if female < male else "equal to",
+        "female_count": female, "female_share": female / max(female + male, 1),
+        "male_count": male, "male_share": male / max(female + male, 1),
+    })
+    means = _means(cube, ["gender_label"])
+    if "Female" in means and "Male" in means:
+        female_mean, male_mean = means["Female"], means["Male"]
+        if abs(female_mean - male_mean) < SIMILAR_MEANS:
+            gender_means = "There is very little difference in the average scores between genders, with"
+        else:
+            higher = "females" if female_mean > male_mean else "males"
+            gender_means = f"On average, {higher} score higher, with"
+        facts["gender"]["gender_means"] = (f"{gender_means} females having an average score of **{female_mean:.2f}** "
+                                           f"and males having an average score of **{male_mean:.2f}**.")
+    elif means:
+        ((gender, mean),) = means.items()
+        facts["gender"]["only_gender_mean"] = f"Only {gender.lower()}s are scored, with an average score of **{mean:.2f}**."
+
+    # Race: the two largest groups and the two highest averages
+    races = cube.value_counts("reth")
+    total = races.sum()
+    for rank, (race, count) in zip(("largest_race", "second_race"), races.items()):
+        facts["race"].update({rank: race, f"{rank}_count": int(count), f"{rank}_share": count / total})
+    ranked = sorted(_means(cube, ["reth"]).items(), key=lambda item: -item[1])
+    if len(ranked) > 1:
+        facts["race"].update({"best_race": ranked[0][0], "best_race_mean": ranked[0][1],
+                              "next_race": ranked[1][0], "next_race_mean": ranked[1][1]})
+    elif ranked:
+        facts["race"].update({"only_race": ranked[0][0], "only_race_mean": ranked[0][1]})
+
+    # District x race: best and worst year of every district, for each race
+    facts["district_race"] = {
+        race: {"race": race, "district_race_blocks": _district_race_block(cube, race, districts, years)}
+        for race in cube.options("reth")
+    }
+    return facts
+
+
+def insights(path=DATA_FILE):
+    """Return the narrative facts of the dataset at `path`, computed once per dataset version."""
+    return cached_by_version(path, "insights", lambda p: compute_insights(load_cube(p)))
+
+
+def narrative(section, path=DATA_FILE, race=None):
+    """Return the markdown narrative of `section`; the district x race one is for `race`."""
+    facts = insights(path)[section]
+    if section == "district_race":
+        facts = facts.get(race) or {"race": race, "district_race_blocks": f"    No {race} teachers in the data."}
+    return _fill(TEMPLATES[section], facts)
@@ -0,0 +1,650 @@
+"""Incremental ETL that rebuilds the merged dataset from the yearly teval/tdemo extracts.
+
+The steps are the ones listed on the Data Prepare page (and prototyped in
+TERA.ipynb), run in memory per year. A year is only reprocessed when the
+content hash of its teval/tdemo files changes; the other years are reused
+from the partition cache.
+
+    python tera_pipeline.py --data-dir . --output all.arrow --csv all.csv --workers 4
+
+With --chunksize the extracts are streamed instead of loaded whole: chunks
+are normalized, spilled to disk in buckets of districts and joined one
+bucket at a time, so memory follows the largest bucket, not the data. The
+merged rows are then put back in the order the in-memory mode writes them.
+"""
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import tera_quality
+from tera_data import COLUMNS, DTYPES, nan_as_value, read_dataset, replacing, write_dataset
+
+# Bump when the cleaning logic changes so cached partitions are rebuilt
+PIPELINE_VERSION = 6
+
+CACHE_DIR = ".tera_cache"
+MANIFEST_FILE = "manifest.json"
+
+# Raw yearly extracts; the *_reth/*_female/*_district intermediates do not match
+SOURCE_PATTERN = re.compile(r"^(teval|tdemo)(\d{4})\.csv$")
+MERGE_KEYS = ["id", "year", "districtname"]
+
+# Per-source normalization rules, applied in order to every file whose name
+# matches the glob pattern. A new year only needs a new entry here (or in a
+# JSON file passed with --rules), not new code:
+#   recode:       column -> {old value: new value}
+#   strip_suffix: column -> suffix removed, case-insensitively, from the end of each value
+#   dtype:        column -> dtype it is cast to, instead of its SOURCE_DTYPES entry
+NORMALIZATION_RULES = [
+    ["tdemo2013.csv", {"recode": {"reth": {"1": "White", "2": "Black", "3": "Hispanic", "4": "Other"}}}],
+    ["tdemo2014.csv", {"recode": {"female": {"1": 0, "2": 1}}}],
+    ["teval*.csv", {"strip_suffix": {"districtname": "District"}}],
+]
+
+# Default target dtypes of the raw extract columns once normalized; `dtype` rules override them
+SOURCE_DTYPES = {
+    "id": "int32",
+    "year": "int16",
+    "districtname": "category",
+    "female": "int8",
+    "reth": "category",
+    "eval": "float32",
+}
+
+
+def recode_categories(values, relabel):
+    """Relabel a column through its categories, so the work is per category and not per row.
+
+    `relabel` maps each old category label to its new label. Categories that
+    end up with the same label are merged.
+    """
+    cat = values.astype("category")
+    labels, uniques = pd.factorize(np.array([relabel(c) for c in cat.cat.categories], dtype=object))
+    # Map every old code to its new one; the appended -1 keeps missing values missing
+    codes = np.append(labels, -1)[cat.cat.codes.to_numpy()]
+    categories = pd.Index(uniques.tolist())  # infer str/int categories again
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=values.index, name=values.name)
+
+
+def _rule_key(label):
+    """Rule key of a label; a column with blanks is parsed as float, so 2.0 matches "2"."""
+    if isinstance(label, float) and label.is_integer():
+        label = int(label)
+    return str(label)
+
+
+def _recode(mapping):
+    mapping = {_rule_key(k): v for k, v in mapping.items()}
+    return lambda label: mapping.get(_rule_key(label), label)
+
+
+def _strip_suffix(suffix):
+    pattern = re.compile(r"\s*" + re.escape(suffix.strip()) + r"\s*$", re.IGNORECASE)
+    return lambda label: pattern.sub("", str(label)).strip()
+
+
+RULE_TYPES = {"recode": _recode, "strip_suffix": _strip_suffix}
+
+
+def normalize_frame(df, name, rules=None):
+    """Apply every rule matching file `name` to `df`, profile it and cast it to its target dtypes.
+
+    The quality profile (see tera_quality) is taken before the cast, so missing
+    values are counted. Rows missing a value in an integer column cannot be
+    cast; they are dropped and counted in the profile. Returns the frame and
+    its profile.
+    """
+    dtypes = dict(SOURCE_DTYPES)
+    for pattern, rule in NORMALIZATION_RULES if rules is None else rules:
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        for rule_type, columns in rule.items():
+            if rule_type == "dtype":
+                dtypes.update(columns)
+                continue
+            for column_name, arg in columns.items():
+                if column_name in df:
+                    df[column_name] = recode_categories(df[column_name], RULE_TYPES[rule_type](arg))
+    profile = tera_quality.profile_frame(df)
+    dtypes = {c: t for c, t in dtypes.items() if c in df}
+    integers = [c for c, t in dtypes.items() if pd.api.types.is_integer_dtype(pd.api.types.pandas_dtype(t))]
+    incomplete = df[integers].isna().any(axis=1).to_numpy()
+    profile["incomplete_rows"] = int(incomplete.sum())
+    if profile["incomplete_rows"]:
+        df = df[~incomplete]
+    return df.astype(dtypes), profile
+
+
+def clean_file(path, rules=None):
+    """Read one yearly extract and normalize it; returns the frame and its quality profile."""
+    # Label columns are parsed straight to categories so the rules only touch each label once
+    df = pd.read_csv(path, dtype={"districtname": "category", "reth": "category"})
+    return normalize_frame(df, os.path.basename(path), rules)
+
+
+def combine_by_filename(file_list, key=MERGE_KEYS, max_workers=None, rules=None):
+    """Read and clean `file_list` in parallel and combine them with one concat.
+
+    Rows are deduplicated on `key` (first occurrence wins) by comparing a
+    64-bit hash of the key columns. Returns the combined DataFrame, the
+    number of duplicate rows dropped from each file and each file's quality
+    profile (see tera_quality).
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames, profiles = zip(*pool.map(clean_file, file_list, [rules] * len(file_list)))
+    names = [os.path.basename(f) for f in file_list]
+    # Align categories so the concat keeps the columns categorical
+    for column_name in ("districtname", "reth"):
+        if all(column_name in df for df in frames):
+            categories = pd.api.types.union_categoricals([df[column_name] for df in frames]).categories
+            for df in frames:
+                df[column_name] = df[column_name].cat.set_categories(categories)
+    combined_df = pd.concat(frames, ignore_index=True)
+    combined_df["source_file"] = pd.Categorical(
+        np.repeat(names, [len(df) for df in frames]), categories=names
+    )
+
+    duplicated = pd.util.hash_pandas_object(combined_df[key], index=False).duplicated()
+    dropped = combined_df.loc[duplicated.to_numpy(), "source_file"].value_counts().reindex(names, fill_value=0)
+    return combined_df[~duplicated.to_numpy()].reset_index(drop=True), dropped.to_dict(), dict(zip(names, profiles))
+
+
+def encode_keys(demo_df, eval_df):
+    """Pack (districtname, year, id) into one int64 per row, using codes shared by both sides."""
+    districts = demo_df["districtname"].astype("category").cat.categories.union(
+        eval_df["districtname"].astype("category").cat.categories
+    )
+    years = np.concatenate([demo_df["year"].to_numpy(), eval_df["year"].to_numpy()]).astype(np.int64)
+    ids = np.concatenate([demo_df["id"].to_numpy(), eval_df["id"].to_numpy()]).astype(np.int64)
+    # Python ints, so the size check itself cannot wrap around
+    first_year = int(years.min()) if len(years) else 0
+    year_span = int(years.max()) - first_year + 1 if len(years) else 1
+    id_span = int(ids.max(initial=0)) + 1
+    if ids.min(initial=0) < 0 or (len(districts) + 1) * year_span * id_span >= 2 ** 63:
+        raise ValueError("merge keys do not fit in a single int64")
+
+    def encode(df):
+        district = pd.Categorical(df["districtname"], categories=districts).codes.astype(np.int64)
+        year = df["year"].to_numpy().astype(np.int64) - first_year
+        return (district * year_span + year) * id_span + df["id"].to_numpy().astype(np.int64)
+
+    return encode(demo_df), encode(eval_df)
+
+
+def _first_of_each_key(keys):
+    """Return the rows holding the first occurrence of each key, ordered by key."""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return order[first], sorted_keys[first]
+
+
+def merge_by_keys(demo_df, eval_df, duplicates="first", extra_columns=()):
+    """Inner-join demographic and evaluation rows on (id, year, districtname).
+
+    The composite key is packed into one int64 and both sides are sorted on
+    it. Rows sharing a key on either side are dropped except the first (or
+    raise with duplicates="raise"). Returns the clean column set, plus
+    `extra_columns` of the demo side, and a report of matched, unmatched and
+    duplicate rows per side.
+    """
+    demo_keys, eval_keys = encode_keys(demo_df, eval_df)
+    demo_rows, _ = _first_of_each_key(demo_keys)
+    eval_rows, eval_sorted = _first_of_each_key(eval_keys)
+    report = {
+        "duplicate_demo": len(demo_keys) - len(demo_rows),
+        "duplicate_eval": len(eval_keys) - len(eval_rows),
+    }
+    if duplicates == "raise" and (report["duplicate_demo"] or report["duplicate_eval"]):
+        raise ValueError(f"duplicate merge keys: {report}")
+
+    # Keep the demo file order; look each demo key up in the sorted eval keys
+    demo_rows = np.sort(demo_rows)
+    wanted = demo_keys[demo_rows]
+    pos = np.minimum(np.searchsorted(eval_sorted, wanted), max(len(eval_sorted) - 1, 0))
+    matched = eval_sorted[pos] == wanted if len(eval_sorted) else np.zeros(len(wanted), dtype=bool)
+    left, right = demo_rows[matched], eval_rows[pos[matched]]
+    report["matched"] = len(left)
+    report["unmatched_demo"] = len(demo_rows) - len(left)
+    report["unmatched_eval"] = len(eval_rows) - len(left)
+
+    merged_df = demo_df.iloc[left][["id", "year", "districtname", "female", "reth", *extra_columns]]
+    merged_df = merged_df.reset_index(drop=True)
+    merged_df["eval"] = eval_df["eval"].to_numpy()[right]
+    return merged_df[COLUMNS + list(extra_columns)], report
+
+
+def build_partition(eval_files, demo_files, rules=None):
+    """Run clean -> combine -> merge in memory for the files of one year.
+
+    Returns the merged rows and the year's quality checks.
+    """
+    evals, eval_dropped, eval_profiles = combine_by_filename(eval_files, rules=rules)
+    demos, demo_dropped, demo_profiles = combine_by_filename(demo_files, rules=rules)
+    dropped = {**eval_dropped, **demo_dropped}
+    for name, count in dropped.items():
+        if count:
+            print(f"Dropped {count} duplicate rows from {name}")
+    merged_df, report = merge_by_keys(demos, evals)
+    print(f"Merged {report['matched']} rows; unmatched: {report['unmatched_demo']} demo, "
+          f"{report['unmatched_eval']} eval")
+    return merged_df, tera_quality.year_report({**eval_profiles, **demo_profiles}, dropped, report)
+
+
+def process_year(year, eval_files, demo_files, partition_file, rules=None, chunksize=None):
+    """Build one year's partition and write it to `partition_file`; runs in a worker process.
+
+    Returns the year's quality checks.
+    """
+    if chunksize:
+        quality = build_partition_streaming(eval_files, demo_files, partition_file, chunksize, rules)
+    else:
+        merged_df, quality = build_partition(eval_files, demo_files, rules)
+        write_dataset(merged_df, partition_file)
+    print(f"Processed {year}")
+    return quality
+
+
+# On-disk layout of the streaming mode; labels are plain strings until the output is written.
+# `row` numbers the demo rows of a year in file order, which is the order of the merged rows.
+SPILL_SCHEMAS = {
+    "tdemo": pa.schema([("id", pa.int32()), ("year", pa.int16()), ("districtname", pa.string()),
+                        ("female", pa.int8()), ("reth", pa.string()), ("source_file", pa.string()),
+                        ("row", pa.int64())]),
+    "teval": pa.schema([("id", pa.int32()), ("year", pa.int16()), ("districtname", pa.string()),
+                        ("eval", pa.float32()), ("source_file", pa.string())]),
+}
+PARTITION_SCHEMA = pa.schema([("id", pa.int32()), ("year", pa.string()), ("districtname", pa.string()),
+                              ("female", pa.int8()), ("reth", pa.string()), ("eval", pa.float32())])
+RUN_SCHEMA = PARTITION_SCHEMA.append(pa.field("row", pa.int64()))
+LABEL_COLUMNS = ["year", "districtname", "reth"]
+# Districts are hashed into this many spill files per year, so few files are open at once
+SPILL_BUCKETS = 64
+
+
+def stream_file(path, chunksize, rules=None):
+    """Yield normalized chunks of `chunksize` rows from one yearly extract, with their quality profiles."""
+    name = os.path.basename(path)
+    reader = pd.read_csv(path, dtype={"districtname": "category", "reth": "category"}, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield normalize_frame(chunk, name, rules)
+
+
+def _to_spill(df, schema):
+    """Convert a normalized chunk to `schema`, with categories as plain strings."""
+    columns = {}
+    for field in schema:
+        values = df[field.name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+    return pa.table(columns, schema=schema)
+
+
+def _spill_buckets(districts):
+    """Spill bucket of every row, from a stable hash of its district name (missing: bucket 0)."""
+    categories = districts.cat.categories
+    buckets = np.array([zlib.crc32(str(name).encode()) % SPILL_BUCKETS for name in categories] + [0])
+    return buckets[districts.cat.codes.to_numpy()]
+
+
+def spill_partitions(files, kind, spill_dir, chunksize, rules=None):
+    """Stream `files` into one Arrow file per (year, bucket of districts) under `spill_dir`.
+
+    All rows of a district land in the same bucket, and chunks are appended
+    in file order, so the first row of a key in a spill file is its first
+    occurrence in the extracts. At most SPILL_BUCKETS files per year are open.
+    Returns {(year, bucket): path} and the quality profile of each file.
+    """
+    schema = SPILL_SCHEMAS[kind]
+    writers, paths, profiles = {}, {}, {}
+    row = 0
+    try:
+        for path in files:
+            name = os.path.basename(path)
+            for chunk, profile in stream_file(path, chunksize, rules):
+                profiles[name] = tera_quality.merge_profiles(profiles[name], profile) if name in profiles else profile
+                chunk["source_file"] = name
+                chunk["row"] = np.arange(row, row + len(chunk))
+                row += len(chunk)
+                # Converted once, then cut into (year, bucket) slices; the stable sort keeps file order
+                keys = chunk["year"].to_numpy().astype(np.int64) * SPILL_BUCKETS + _spill_buckets(chunk["districtname"])
+                order = np.argsort(keys, kind="stable")
+                keys = keys[order]
+                table = _to_spill(chunk, schema).take(order)
+                bounds = np.append(np.flatnonzero(np.diff(keys)) + 1, len(keys))
+                for start, end in zip(np.append(0, bounds[:-1]), bounds):
+                    key = tuple(int(k) for k in divmod(keys[start], SPILL_BUCKETS))
+                    if key not in writers:
+                        paths[key] = os.path.join(spill_dir, f"{kind}_{len(paths)}.arrow")
+                        writers[key] = pa.ipc.new_stream(paths[key], schema)
+                    writers[key].write_table(table.slice(start, end - start))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths, profiles
+
+
+def _read_spill(path):
+    with pa.memory_map(path) as source:
+        df = pa.ipc.open_stream(source).read_all().to_pandas()
+    return df.astype({c: "category" for c in ("districtname", "reth", "source_file") if c in df})
+
+
+def _next_batch(reader):
+    """Return the next non-empty batch of a stream as a table, or None at its end."""
+    for batch in reader:
+        if batch.num_rows:
+            return pa.Table.from_batches([batch])
+    return None
+
+
+def _merge_runs(paths):
+    """Yield the rows of the run files at `paths`, each sorted by `row`, as tables in `row` order.
+
+    Only the current batch of every run is held in memory: each step emits
+    the rows up to the smallest last `row` of the current batches.
+    """
+    sources = [pa.memory_map(path) for path in paths]
+    try:
+        readers = [pa.ipc.open_stream(source) for source in sources]
+        current = [_next_batch(reader) for reader in readers]
+        while any(table is not None for table in current):
+            threshold = min(table["row"][-1].as_py() for table in current if table is not None)
+            taken = []
+            for i, table in enumerate(current):
+                if table is None:
+                    continue
+                take = pc.less_equal(table["row"], threshold)
+                taken.append(table.filter(take))
+                rest = table.filter(pc.invert(take))
+                current[i] = rest if rest.num_rows else _next_batch(readers[i])
+            yield pa.concat_tables(taken).sort_by("row").drop_columns(["row"])
+    finally:
+        for source in sources:
+            source.close()
+
+
+def _dedup(df, key=MERGE_KEYS):
+    """Drop repeated keys (first occurrence wins); returns the rows kept and the drops per file."""
+    duplicated = pd.util.hash_pandas_object(df[key], index=False).duplicated().to_numpy()
+    return df[~duplicated].reset_index(drop=True), df.loc[duplicated, "source_file"].value_counts().to_dict()
+
+
+def build_partition_streaming(eval_files, demo_files, partition_file, chunksize, rules=None):
+    """Like build_partition, but spilling to disk and joining one (year, bucket) at a time.
+
+    The merged rows of every bucket are written to a run file sorted by demo
+    row; the runs are then merged into `partition_file` in that order, the
+    same as build_partition. Returns the year's quality checks.
+    """
+    dropped = {}
+    totals = {"duplicate_demo": 0, "duplicate_eval": 0, "matched": 0, "unmatched_demo": 0, "unmatched_eval": 0}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(partition_file) or ".") as spill_dir:
+        evals, eval_profiles = spill_partitions(eval_files, "teval", spill_dir, chunksize, rules)
+        demos, demo_profiles = spill_partitions(demo_files, "tdemo", spill_dir, chunksize, rules)
+        runs = []
+        for key in sorted(set(evals) | set(demos)):
+            sides = []
+            for spills in (demos, evals):
+                df, counts = _dedup(_read_spill(spills[key])) if key in spills else (None, {})
+                for name, count in counts.items():
+                    dropped[name] = dropped.get(name, 0) + count
+                sides.append(df)
+            demo_df, eval_df = sides
+            if demo_df is None or eval_df is None:
+                side = "demo" if eval_df is None else "eval"
+                totals[f"unmatched_{side}"] += len(demo_df if eval_df is None else eval_df)
+                continue
+            merged_df, report = merge_by_keys(demo_df, eval_df, extra_columns=["row"])
+            for name in totals:
+                totals[name] += report[name]
+            runs.append(os.path.join(spill_dir, f"run_{len(runs)}.arrow"))
+            with pa.ipc.new_stream(runs[-1], RUN_SCHEMA) as writer:
+                writer.write_table(_to_spill(merged_df.astype({"year": str}), RUN_SCHEMA), max_chunksize=chunksize)
+        with replacing(partition_file) as temp:
+            with pa.OSFile(temp, "wb") as sink, pa.ipc.new_file(sink, PARTITION_SCHEMA) as writer:
+                for table in _merge_runs(runs):
+                    writer.write_table(table)
+    for name, count in dropped.items():
+        if count:
+            print(f"Dropped {count} duplicate rows from {name}")
+    print(f"Merged {totals['matched']} rows; unmatched: {totals['unmatched_demo']} demo, "
+          f"{totals['unmatched_eval']} eval")
+    return tera_quality.year_report({**eval_profiles, **demo_profiles}, dropped, totals)
+
+
+def write_partitions(partition_files, output, csv_output=None):
+    """Write the concatenation of `partition_files` to `output` (and `csv_output`) one batch at a time.
+
+    Label dictionaries are collected first from the label columns only, so
+    every batch is written with the same sorted categories.
+    """
+    labels = {column_name: set() for column_name in LABEL_COLUMNS}
+    for path in partition_files:
+        frame = read_dataset(path, LABEL_COLUMNS)
+        for column_name in LABEL_COLUMNS:
+            labels[column_name].update(frame[column_name].dropna().astype(str).unique())
+    dtypes = {**DTYPES, **{c: pd.CategoricalDtype(sorted(labels[c])) for c in LABEL_COLUMNS}}
+    schema = pa.Schema.from_pandas(pd.DataFrame({c: pd.Series(dtype=dtypes[c]) for c in COLUMNS}),
+                                   preserve_index=False)
+
+    parquet = os.path.splitext(output)[1].lower() == ".parquet"
+    header = True
+    # Written aside and renamed into place, as the dashboard may have `output` mapped
+    with replacing(output) as temp:
+        if parquet:
+            writer = pq.ParquetWriter(temp, schema)
+        else:
+            sink = pa.OSFile(temp, "wb")
+            writer = pa.ipc.new_file(sink, schema)
+        try:
+            for path in partition_files:
+                with pa.memory_map(path) as source:
+                    reader = pa.ipc.open_file(source)
+                    for i in range(reader.num_record_batches):
+                        frame = reader.get_batch(i).to_pandas()[COLUMNS]
+                        frame = frame.astype({"year": str}).astype(dtypes)
+                        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+                        writer.write_table(nan_as_value(table, frame))
+                        if csv_output:
+                            frame.to_csv(csv_output, mode="w" if header else "a", header=header, index=False)
+                            header = False
+        finally:
+            writer.close()
+            if not parquet:
+                sink.close()
+
+
+def discover_sources(data_dir):
+    """Group the raw teval*/tdemo* extracts in `data_dir` by year."""
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "t*.csv"))):
+        match = SOURCE_PATTERN.match(os.path.basename(path))
+        if match:
+            kind, year = match.groups()
+            sources.setdefault(year, {"teval": [], "tdemo": []})[kind].append(path)
+    return sources
+
+
+def file_digest(path, known=None):
+    """Return the sha256 of `path`, reusing `known` when size and mtime are unchanged."""
+    st = os.stat(path)
+    if known and known.get("size") == st.st_size and known.get("mtime_ns") == st.st_mtime_ns:
+        return known
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha.hexdigest()}
+
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"files": {}, "partitions": {}, "outputs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(cache_dir, manifest):
+    with open(os.path.join(cache_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def run_pipeline(data_dir=".", output="all.arrow", csv_output="all.csv", force=False, workers=None,
+                 rules=None, chunksize=None, quality_output=None):
+    """Rebuild the merged dataset, reprocessing only years whose inputs changed.
+
+    Changed years are read and normalized in parallel on `workers` processes
+    (default: one per core; 1 processes them in this process). Returns the
+    merged DataFrame. `rules` replaces NORMALIZATION_RULES. With `chunksize`
+    the extracts are streamed (see build_partition_streaming), the outputs are
+    written batch by batch and None is returned. The quality checks of every
+    year are written to `quality_output` (default: QUALITY_FILE in `data_dir`;
+    an empty string skips it, see tera_quality).
+    """
+    rules = NORMALIZATION_RULES if rules is None else rules
+    cache_dir = os.path.join(data_dir, CACHE_DIR)
+    if quality_output is None:
+        quality_output = os.path.join(data_dir, tera_quality.QUALITY_FILE)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    if force:
+        manifest["partitions"] = {}
+
+    sources = discover_sources(data_dir)
+    files = {}
+    added, changed, jobs, incomplete = [], [], [], []
+    for year, inputs in sorted(sources.items()):
+        paths = inputs["teval"] + inputs["tdemo"]
+        for path in paths:
+            name = os.path.basename(path)
+            files[name] = file_digest(path, manifest["files"].get(name))
+        digest = hashlib.sha256(
+            json.dumps([PIPELINE_VERSION, rules] + [files[os.path.basename(p)]["sha256"] for p in paths]).encode()
+        ).hexdigest()
+
+        partition_file = os.path.join(cache_dir, f"partition_{year}.arrow")
+        previous = manifest["partitions"].get(year)
+        if previous and previous["digest"] == digest and os.path.exists(partition_file):
+            print(f"Skipping {year}: inputs unchanged")
+            continue
+        if not inputs["teval"] or not inputs["tdemo"]:
+            print(f"Skipping {year}: needs both teval and tdemo files")
+            if year in manifest["partitions"]:
+                # Its old partition would keep serving rows of an extract that is gone
+                if os.path.exists(partition_file):
+                    os.remove(partition_file)
+                incomplete.append(year)
+            continue
+
+        jobs.append((year, inputs["teval"], inputs["tdemo"], partition_file, rules, chunksize))
+        manifest["partitions"][year] = {"digest": digest}
+        (added if previous is None and not force else changed).append(year)
+
+    if workers == 1 or len(jobs) < 2:
+        qualities = [process_year(*job) for job in jobs]
+    else:
+        # Wall-clock time follows the largest year instead of the sum of all years
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            qualities = list(pool.map(process_year, *zip(*jobs)))
+    # Unchanged years keep the checks recorded when they were processed
+    for job, quality in zip(jobs, qualities):
+        manifest["partitions"][job[0]]["quality"] = quality
+
+    removed = [year for year in manifest["partitions"] if year not in sources] + incomplete
+    for year in removed:
+        manifest["partitions"].pop(year, None)
+    manifest["files"] = files
+
+    years = sorted(manifest["partitions"])
+    if quality_output:
+        report = tera_quality.build_report(
+            {year: manifest["partitions"][year]["quality"] for year in years if "quality" in manifest["partitions"][year]}
+        )
+        tera_quality.write_report(report, quality_output)
+        summary = report["summary"]
+        print(f"Quality: {summary['duplicate_keys']} duplicate keys, {summary['invalid_values']} invalid values, "
+              f"{summary['district_conflicts']} district conflicts; report saved as {quality_output}")
+    partition_files = [os.path.join(cache_dir, f"partition_{year}.arrow") for year in years]
+    outputs = manifest["outputs"]
+    if chunksize:
+        csv_current = not csv_output or (os.path.exists(csv_output) and outputs.get(csv_output) == _stat(csv_output))
+        if added or changed or removed or not os.path.exists(output) or not csv_current:
+            write_partitions(partition_files, output, csv_output)
+            print(f"Dataset saved as {output}")
+            if csv_output:
+                outputs[csv_output] = _stat(csv_output)
+        _save_manifest(cache_dir, manifest)
+        return None
+
+    merged_df = pd.concat([read_dataset(path) for path in partition_files], ignore_index=True)
+
+    if added or changed or removed or not os.path.exists(output):
+        write_dataset(merged_df, output)
+        print(f"Dataset saved as {output}")
+    if csv_output:
+        # The CSV is current if it is exactly what the last run wrote
+        csv_current = os.path.exists(csv_output) and outputs.get(csv_output) == _stat(csv_output)
+        # Appending keeps the file in year order only if every new year comes last
+        appendable = added and min(added) > max((year for year in years if year not in added), default="")
+        if csv_current and appendable and not (changed or removed):
+            # Only new years: append them instead of rewriting the whole file
+            new_rows = merged_df[merged_df["year"].astype(str).isin(added)]
+            new_rows.to_csv(csv_output, mode="a", header=False, index=False)
+            print(f"Appended {len(new_rows)} rows to {csv_output}")
+        elif not csv_current or added or changed or removed:
+            merged_df.to_csv(csv_output, index=False)
+            print(f"Merged CSV saved as {csv_output}")
+        outputs[csv_output] = _stat(csv_output)
+
+    _save_manifest(cache_dir, manifest)
+    return merged_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the merged teacher evaluation dataset.")
+    parser.add_argument("--data-dir", default=".", help="directory with the teval*/tdemo* extracts")
+    parser.add_argument("--output", default="all.arrow", help="columnar output (.arrow or .parquet)")
+    parser.add_argument("--csv", default="all.csv", help="CSV export; pass an empty string to skip")
+    parser.add_argument("--force", action="store_true", help="reprocess every year")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to ingest changed years (default: one per core)")
+    parser.add_argument("--rules", help="JSON file with normalization rules replacing the built-in ones")
+    parser.add_argument("--quality", default=None,
+                        help="data-quality report (JSON, default: quality.json in --data-dir); "
+                             "pass an empty string to skip")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the extracts in chunks of this many rows, for inputs larger than memory")
+    args = parser.parse_args(argv)
+    rules = None
+    if args.rules:
+        with open(args.rules) as f:
+            rules = json.load(f)
+    run_pipeline(args.data_dir, args.output, args.csv, args.force, args.workers, rules, args.chunksize,
+                 args.quality)
+
+
+if __name__ == "__main__":
+    main()
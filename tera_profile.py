@@ -0,0 +1,141 @@
+"""Named stage timers and memory counters, aggregated across reruns.
+
+Off by default. TERA_PROFILE=1 records every `timer` block of the process
+and traces memory; `report()` then gives p50/p95 per stage and
+`export_json()` writes it out, e.g. to compare runs as the data grows.
+A single dashboard session (?profile=1) records wall times into its own
+samples instead, see `use_session`, and leaves the rest of the process alone.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# Samples kept per stage; older reruns are dropped first
+MAX_SAMPLES = 1000
+
+_enabled = os.environ.get("TERA_PROFILE", "") not in ("", "0")
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))  # stage -> (seconds, bytes)
+_samples_lock = threading.Lock()
+# Samples of the session whose script runs in the current thread, if it profiles itself
+_session_samples = contextvars.ContextVar("tera_profile_session", default=None)
+
+
+def enabled():
+    """Whether the whole process records (TERA_PROFILE or enable())."""
+    return _enabled
+
+
+def active():
+    """Whether timers record anything here: process-wide, or for the current session."""
+    return _enabled or _session_samples.get() is not None
+
+
+def new_samples():
+    """Empty per-stage samples, e.g. for one session to keep in its state."""
+    return defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+
+def use_session(samples):
+    """Record the timers of the current thread into `samples` (None: stop); call on every rerun.
+
+    Only wall times are recorded this way; memory is traced process-wide, so
+    allocations are only counted while TERA_PROFILE is on.
+    """
+    _session_samples.set(samples)
+
+
+def enable(on=True):
+    """Turn recording on or off for the whole process; memory is traced while it is on."""
+    global _enabled
+    _enabled = on
+    if on and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not on and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    with _samples_lock:
+        _samples.clear()
+
+
+def record(name, seconds, allocated=0):
+    """Add one sample for stage `name` to the current session and/or the process, when recording."""
+    samples = _session_samples.get()
+    if samples is not None:
+        samples[name].append((seconds, allocated))
+    if _enabled:
+        with _samples_lock:
+            _samples[name].append((seconds, allocated))
+
+
+@contextmanager
+def timer(name):
+    """Record the wall time and net allocated memory of the block under stage `name`."""
+    if not active():
+        yield
+        return
+    start_mem = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[0] - start_mem if tracemalloc.is_tracing() else 0
+        record(name, elapsed, allocated)
+
+
+def timed(name):
+    """Decorator form of `timer`."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def report(samples=None):
+    """Return {stage: count, total/p50/p95/max ms and p50/max allocated KiB}, slowest p95 first.
+
+    `samples` are a session's (see use_session); by default the process-wide ones.
+    """
+    with _samples_lock:
+        samples = {name: np.array(values) for name, values in (_samples if samples is None else samples).items()
+                   if values}
+    stages = {}
+    for name, values in samples.items():
+        ms = values[:, 0] * 1000
+        kib = values[:, 1] / 1024
+        stages[name] = {
+            "count": len(values),
+            "total_ms": round(float(ms.sum()), 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "p50_kib": round(float(np.percentile(kib, 50)), 1),
+            "max_kib": round(float(kib.max()), 1),
+        }
+    return dict(sorted(stages.items(), key=lambda item: -item[1]["p95_ms"]))
+
+
+def export_json(path=None, samples=None):
+    """Return the report of `samples` (see report) as JSON, also writing it to `path` when given."""
+    text = json.dumps({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": report(samples)}, indent=2)
+    if path is not None:
+        with open(path, "w") as handle:
+            handle.write(text)
+    return text
+
+
+if _enabled:
+    enable()
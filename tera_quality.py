@@ -0,0 +1,186 @@
+"""Data-quality checks on the yearly extracts, run by the pipeline on every ingest.
+
+Each normalized file (or chunk, in streaming mode) is profiled in one pass
+over its columns: nulls, values outside the allowed domains and the
+districtno/districtname pairs it uses. Profiles of chunks add up. The
+pipeline adds the rows it could not cast (a missing id, year or gender),
+the duplicate keys it dropped and the rows the merge could not match, and
+writes everything to quality.json, which the Data Prepare page summarizes.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+QUALITY_FILE = "quality.json"
+
+# Columns every extract of a kind must have
+EXPECTED_COLUMNS = {
+    "teval": ["id", "year", "districtno", "districtname", "eval"],
+    "tdemo": ["id", "year", "districtno", "districtname", "female", "reth"],
+}
+# Allowed values once normalized; nulls are counted separately
+DOMAINS = {
+    "eval": [1, 2, 3, 4, 5],
+    "female": [0, 1],
+    "reth": ["White", "Black", "Hispanic", "Other"],
+}
+
+
+def _label(value):
+    """JSON-friendly form of a value: numbers stay numbers (whole floats become ints), NaN becomes None."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return None if value != value else int(value) if value.is_integer() else value
+    return value if isinstance(value, (int, str)) else str(value)
+
+
+def _district_order(pair):
+    return str(pair[0]), str(pair[1])
+
+
+def profile_frame(df):
+    """Count rows, nulls, out-of-domain values and district pairs of one normalized file or chunk."""
+    invalid = {}
+    for column_name, allowed in DOMAINS.items():
+        if column_name not in df:
+            continue
+        values = df[column_name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Checked once per category; the rows only carry codes
+            bad_codes = np.flatnonzero(~values.cat.categories.isin(allowed))
+            bad = np.isin(values.cat.codes.to_numpy(), bad_codes)
+        else:
+            bad = values.notna().to_numpy() & ~np.isin(values.to_numpy(), allowed)
+        if bad.any():
+            counts = values[bad].value_counts()
+            invalid[column_name] = {str(_label(v)): int(c) for v, c in counts[counts > 0].items()}
+    districts = []
+    if "districtno" in df and "districtname" in df:
+        # districtno is compared as a number, so "000234" and 234 are the same district
+        number = pd.to_numeric(df["districtno"], errors="coerce")
+        pairs = pd.DataFrame({"name": df["districtname"], "number": number})
+        counts = pairs.groupby(["name", "number"], dropna=False, observed=True).size()
+        districts = sorted(([_label(name), _label(no), int(c)] for (name, no), c in counts.items()), key=_district_order)
+    return {
+        "rows": len(df),
+        "columns": list(df.columns),
+        "nulls": {column_name: int(count) for column_name, count in df.isna().sum().items()},
+        "invalid": invalid,
+        "districts": districts,
+    }
+
+
+def merge_profiles(a, b):
+    """Add up the profiles of two chunks of the same file."""
+    invalid = {column_name: dict(counts) for column_name, counts in a["invalid"].items()}
+    for column_name, counts in b["invalid"].items():
+        for value, count in counts.items():
+            invalid.setdefault(column_name, {})
+            invalid[column_name][value] = invalid[column_name].get(value, 0) + count
+    districts = {}
+    for name, number, count in a["districts"] + b["districts"]:
+        districts[(name, number)] = districts.get((name, number), 0) + count
+    return {
+        "rows": a["rows"] + b["rows"],
+        "columns": a["columns"],
+        "nulls": {c: a["nulls"].get(c, 0) + b["nulls"].get(c, 0) for c in a["nulls"]},
+        "invalid": invalid,
+        "districts": sorted(([name, number, count] for (name, number), count in districts.items()), key=_district_order),
+        "incomplete_rows": a["incomplete_rows"] + b["incomplete_rows"],
+    }
+
+
+def file_report(name, profile, duplicate_keys=0):
+    """Turn the profile of file `name` into its checks."""
+    expected = EXPECTED_COLUMNS.get(name[:5], [])
+    rows = max(profile["rows"], 1)
+    return {
+        "rows": profile["rows"],
+        "missing_columns": [c for c in expected if c not in profile["columns"]],
+        "extra_columns": [c for c in profile["columns"] if expected and c not in expected],
+        "duplicate_keys": int(duplicate_keys),
+        "incomplete_rows": profile.get("incomplete_rows", 0),
+        "null_rate": {c: round(n / rows, 6) for c, n in profile["nulls"].items()},
+        "invalid": profile["invalid"],
+        "districts": profile["districts"],
+    }
+
+
+def year_report(profiles, dropped, merge):
+    """Checks of one year: a report per file plus the merge's matched/unmatched counts."""
+    files = {name: file_report(name, profile, dropped.get(name, 0)) for name, profile in profiles.items()}
+    return {"files": files, "merge": merge}
+
+
+def district_conflicts(files):
+    """Return district names used with several numbers, and numbers used with several names.
+
+    `files` maps a file name to its report; the files that use each pairing are listed
+    in name order, so a report rebuilt from the manifest matches a fresh one.
+    """
+    by_name, by_number = {}, {}
+    for file_name, report in sorted(files.items()):
+        for name, number, _ in report["districts"]:
+            by_name.setdefault(name, {}).setdefault(str(number), []).append(file_name)
+            by_number.setdefault(number, {}).setdefault(str(name), []).append(file_name)
+    conflicts = [{"districtname": name, "districtno": uses} for name, uses in by_name.items() if len(uses) > 1]
+    conflicts += [{"districtno": number, "districtname": uses} for number, uses in by_number.items() if len(uses) > 1]
+    return conflicts
+
+
+def build_report(years):
+    """Combine the per-year results ({"files": ..., "merge": ...}) into the full report."""
+    files = {name: report for year in years.values() for name, report in year["files"].items()}
+    conflicts = district_conflicts(files)
+    summary = {
+        "years": len(years),
+        "files": len(files),
+        "rows": sum(r["rows"] for r in files.values()),
+        "duplicate_keys": sum(r["duplicate_keys"] for r in files.values()),
+        "incomplete_rows": sum(r.get("incomplete_rows", 0) for r in files.values()),
+        "invalid_values": sum(sum(c.values()) for r in files.values() for c in r["invalid"].values()),
+        "schema_issues": sum(bool(r["missing_columns"] or r["extra_columns"]) for r in files.values()),
+        "district_conflicts": len(conflicts),
+        "matched": sum(y["merge"]["matched"] for y in years.values()),
+        "unmatched_demo": sum(y["merge"]["unmatched_demo"] for y in years.values()),
+        "unmatched_eval": sum(y["merge"]["unmatched_eval"] for y in years.values()),
+    }
+    return {"summary": summary, "district_conflicts": conflicts, "years": years}
+
+
+def write_report(report, path=QUALITY_FILE):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path=QUALITY_FILE):
+    """Return the last report the pipeline wrote, or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def file_table(report):
+    """One row per file: rows, duplicates, incomplete rows, invalid values, schema issues and the highest null rate."""
+    records = []
+    for year, result in sorted(report["years"].items()):
+        for name, checks in sorted(result["files"].items()):
+            worst = max(checks["null_rate"].items(), key=lambda item: item[1], default=("", 0))
+            records.append({
+                "year": year,
+                "file": name,
+                "rows": checks["rows"],
+                "duplicate keys": checks["duplicate_keys"],
+                "incomplete rows dropped": checks.get("incomplete_rows", 0),
+                "invalid values": sum(sum(c.values()) for c in checks["invalid"].values()),
+                "schema issues": ", ".join(
+                    [f"missing {c}" for c in checks["missing_columns"]]
+                    + [f"extra {c}" for c in checks["extra_columns"]]
+                ),
+                "highest null rate": f"{worst[0]} {worst[1]:.1%}" if worst[1] else "",
+            })
+    return pd.DataFrame(records)
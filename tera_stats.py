@@ -0,0 +1,82 @@
+"""Chi-square and Cramer's V between demographics and evaluation scores, from cube counts."""
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+from tera_cube import load_cube
+from tera_data import DATA_FILE, cached_by_version
+from tera_profile import timed
+
+# Demographic columns tested against eval
+DEMOGRAPHICS = ["gender_label", "reth"]
+
+
+@timed("stats.chi2")
+def chi2_statistics(tables):
+    """Chi-square test and Cramer's V for a stack of contingency tables in one vectorized pass.
+
+    `tables` has shape (..., rows, columns). Empty rows and columns are
+    ignored, and Yates' correction is applied to 2x2 tables, as
+    scipy.stats.chi2_contingency does. Returns a dict of arrays with the
+    leading shape of `tables`.
+    """
+    observed = np.asarray(tables, dtype=np.float64)
+    row_sums = observed.sum(axis=-1, keepdims=True)
+    col_sums = observed.sum(axis=-2, keepdims=True)
+    n = observed.sum(axis=(-2, -1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = row_sums * col_sums / n[..., None, None]
+        rows = (row_sums[..., 0] > 0).sum(axis=-1)
+        cols = (col_sums[..., 0, :] > 0).sum(axis=-1)
+        dof = (rows - 1) * (cols - 1)
+
+        diff = np.abs(observed - expected)
+        yates = (dof == 1)[..., None, None]
+        diff = np.where(yates, np.maximum(diff - 0.5, 0), diff)
+        chi2 = np.where(expected > 0, diff * diff / expected, 0).sum(axis=(-2, -1))
+
+        min_dim = np.minimum(rows, cols) - 1
+        cramers_v = np.sqrt(chi2 / (n * min_dim))
+    valid = dof > 0
+    return {
+        "n": n.astype(np.int64),
+        "chi2": np.where(valid, chi2, np.nan),
+        "dof": dof,
+        "p": np.where(valid, stats.chi2.sf(chi2, np.maximum(dof, 1)), np.nan),
+        "cramers_v": np.where(valid, cramers_v, np.nan),
+    }
+
+
+def contingency(dim, path=DATA_FILE, **filters):
+    """Return the `dim` x eval contingency table, read from the aggregate cube."""
+    counts = load_cube(path).score_counts([dim], **filters)
+    return counts.pivot(index=dim, columns="eval", values="count")
+
+
+def association(dim, path=DATA_FILE):
+    """Return chi2, p, dof, n and Cramer's V between `dim` and eval, cached per dataset version."""
+    def build(path):
+        result = chi2_statistics(contingency(dim, path).to_numpy())
+        return {key: value.item() for key, value in result.items()}
+    return cached_by_version(path, f"association:{dim}", build)
+
+
+def association_table(dims=DEMOGRAPHICS, by=("districtname", "year"), path=DATA_FILE):
+    """Return the association of each of `dims` with eval in every `by` stratum.
+
+    All strata of a dimension are tested together on the cube histogram,
+    without building a crosstab per combination. Cached per dataset version.
+    """
+    def build(path):
+        cube = load_cube(path)
+        frames = []
+        for dim in dims:
+            # Axes: by..., dim, eval; the missing-label slot of `dim` is left out
+            hist, _ = cube.histogram_array(list(by) + [dim])
+            result = chi2_statistics(hist)
+            index = pd.MultiIndex.from_product([cube.levels[b] for b in by], names=list(by))
+            frame = pd.DataFrame({key: np.ravel(value) for key, value in result.items()}, index=index)
+            frames.append(frame.assign(variable=dim).reset_index())
+        table = pd.concat(frames, ignore_index=True)
+        return table[table["n"] > 0].reset_index(drop=True)
+    return cached_by_version(path, f"association_table:{','.join(dims)}:{','.join(by)}", build)
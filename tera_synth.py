@@ -0,0 +1,137 @@
+"""Synthetic teval/tdemo extracts with the schemas and quirks of the real ones, at any scale.
+
+Teachers keep their district, gender and race across years, and each year
+samples from the same teacher pool. The per-year quirks the pipeline's
+NORMALIZATION_RULES undo are reproduced:
+
+- 2013: numeric `reth` codes (1 White, 2 Black, 3 Hispanic, 4 Other) in tdemo
+- 2014: `female` coded 1/2 in tdemo and zero-padded `districtno` in teval
+- 2015 and later: "X District" names in teval
+
+    python tera_synth.py --rows 1000000 --out-dir synth
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# The real districts, their numbers and share of rows
+DISTRICTS = {"Radnor": 234, "Westlake": 122, "Kentwood": 987}
+DISTRICT_WEIGHTS = [0.84, 0.04, 0.12]
+RACES = ["White", "Black", "Hispanic", "Other"]
+RACE_WEIGHTS = [0.87, 0.07, 0.05, 0.01]
+RACE_CODES = {race: str(code) for code, race in enumerate(RACES, start=1)}
+EVAL_WEIGHTS = [0.01, 0.08, 0.27, 0.40, 0.24]  # scores 1..5
+FEMALE_SHARE = 0.78
+MISSING_RETH = 0.015
+MISSING_EVAL = 0.05
+# Share of rows only present in one of the two files of a year
+UNMATCHED_RATE = 0.02
+
+
+def district_table(districts=3):
+    """Return district names, numbers and row shares; extra districts are named Synth001..."""
+    names = list(DISTRICTS)[:districts]
+    numbers = list(DISTRICTS.values())[:districts]
+    weights = DISTRICT_WEIGHTS[:districts]
+    extra = districts - len(names)
+    if extra > 0:
+        names += [f"Synth{i:03d}" for i in range(1, extra + 1)]
+        numbers += [1000 + i for i in range(1, extra + 1)]
+        weights = [1.0] * districts
+    weights = np.asarray(weights, dtype=np.float64)
+    return names, np.asarray(numbers), weights / weights.sum()
+
+
+def _with_duplicates(frame, rate, rng, column=None):
+    """Append `rate` x len(frame) copies of random rows; `column` gets new values in the copies."""
+    count = int(len(frame) * rate)
+    if not count:
+        return frame
+    copies = frame.iloc[rng.integers(0, len(frame), count)].copy()
+    if column is not None:
+        copies[column] = rng.permutation(copies[column].to_numpy())
+    return pd.concat([frame, copies]).sort_values("districtno", kind="stable")
+
+
+def generate(out_dir, rows=14_000, years=(2013, 2014, 2015), districts=3, teachers=None,
+             duplicate_rate=0.005, seed=0):
+    """Write teval<year>.csv and tdemo<year>.csv to `out_dir`; `rows` is the merged size over all years.
+
+    `teachers` is the size of the teacher pool (default 1.4x the rows of one
+    year), raised if needed to the teachers sampled per year, unmatched ones
+    included. Returns the paths written.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    names, numbers, weights = district_table(districts)
+    per_year = max(rows // len(years), 1)
+    # Teachers only in the demo or only in the eval extract, per side
+    extra = int(per_year * UNMATCHED_RATE)
+    teachers = max(teachers or int(per_year * 1.4), per_year + 2 * extra)
+
+    # Fixed attributes of every teacher in the pool
+    home = rng.choice(len(names), teachers, p=weights).astype(np.int32)
+    female = (rng.random(teachers) < FEMALE_SHARE).astype(np.int8)
+    race = rng.choice(len(RACES), teachers, p=RACE_WEIGHTS).astype(np.int8)
+    ids = rng.permutation(np.arange(1, teachers + 1, dtype=np.int32))
+
+    written = []
+    for year in years:
+        pool = rng.choice(teachers, per_year + 2 * extra, replace=False)
+        pool = pool[np.argsort(home[pool], kind="stable")]  # grouped by district, like the extracts
+        in_demo = np.ones(len(pool), dtype=bool)
+        in_eval = np.ones(len(pool), dtype=bool)
+        only = rng.permutation(len(pool))[:2 * extra]
+        in_eval[only[:extra]] = False
+        in_demo[only[extra:]] = False
+
+        district = home[pool]
+        reth = pd.Categorical.from_codes(race[pool], RACES).astype(object)
+        reth[rng.random(len(pool)) < MISSING_RETH] = None
+        demo = pd.DataFrame({
+            "id": ids[pool],
+            "year": year,
+            "districtno": numbers[district],
+            "districtname": np.asarray(names, dtype=object)[district],
+            "female": female[pool],
+            "reth": reth,
+        })
+        score = pd.array(rng.choice(5, len(pool), p=EVAL_WEIGHTS) + 1, dtype="Int64")
+        score[rng.random(len(pool)) < MISSING_EVAL] = pd.NA
+        evals = demo[["id", "year", "districtno", "districtname"]].assign(eval=score)
+
+        if year == 2013:
+            demo["reth"] = demo["reth"].map(RACE_CODES)
+        if year == 2014:
+            demo["female"] = demo["female"] + 1
+            evals["districtno"] = evals["districtno"].map("{:06d}".format)
+        if year >= 2015:
+            evals["districtname"] = evals["districtname"] + " District"
+
+        for kind, frame, keep, column in (("tdemo", demo, in_demo, None), ("teval", evals, in_eval, "eval")):
+            path = os.path.join(out_dir, f"{kind}{year}.csv")
+            _with_duplicates(frame[keep], duplicate_rate, rng, column).to_csv(path, index=False)
+            written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic teval/tdemo extracts.")
+    parser.add_argument("--out-dir", default="synth", help="directory the CSV files are written to")
+    parser.add_argument("--rows", type=int, default=14_000, help="approximate merged rows over all years")
+    parser.add_argument("--years", type=int, nargs="+", default=[2013, 2014, 2015])
+    parser.add_argument("--districts", type=int, default=3)
+    parser.add_argument("--teachers", type=int, default=None, help="teacher pool size")
+    parser.add_argument("--duplicate-rate", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = generate(args.out_dir, args.rows, args.years, args.districts, args.teachers,
+                     args.duplicate_rate, args.seed)
+    print(json.dumps(paths, indent=2))
+
+
+if __name__ == "__main__":
+    main()
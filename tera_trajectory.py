@@ -0,0 +1,180 @@
+"""Per-teacher trajectories: every teacher's records across years, in flat sorted arrays.
+
+Rows are sorted by (id, year) once per dataset version; a teacher's records
+are the slice between two offsets, found with a binary search on the
+sorted ids. Consecutive-year pairs of the same teacher (every record of a
+year with every record of the next, as a teacher can have records in
+several districts in one year) are precomputed, so
+score changes, retention and district transfers are bincounts over the
+pairs instead of self-joins of the frame. The arrays are kept in the
+dataset's shared store, so every process maps the same copy.
+"""
+import numpy as np
+import pandas as pd
+
+from tera_data import DATA_FILE, cached_by_version, load_analysis_frame, shared_arrays
+
+# Name of the arrays in the shared store; bump when their layout changes
+STORE_KIND = "trajectories.2"
+
+
+def consecutive_pairs(row_ids, years):
+    """Return (from, to) row indices pairing every record with the same teacher's records of the next year.
+
+    Rows must be sorted by (id, year). Rows of one teacher and year form a
+    group; each group is paired with the next group when that is the same
+    teacher one year later, every row with every row.
+    """
+    n = len(row_ids)
+    starts = np.flatnonzero(np.append(True, (row_ids[1:] != row_ids[:-1]) | (years[1:] != years[:-1])))
+    sizes = np.diff(np.append(starts, n))
+    follows = np.flatnonzero((row_ids[starts[1:]] == row_ids[starts[:-1]])
+                             & (years[starts[1:]].astype(np.int64) - years[starts[:-1]] == 1))
+    from_size, to_size = sizes[follows], sizes[follows + 1]
+    counts = from_size * to_size
+    group = np.repeat(np.arange(len(follows)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_from = starts[follows][group] + k // to_size[group]
+    pair_to = starts[follows + 1][group] + k % to_size[group]
+    return pair_from, pair_to
+
+
+class TrajectoryIndex:
+    """Records of every teacher ordered by year, with the teachers sorted by id."""
+
+    def __init__(self, ids, offsets, years, districts, evals, district_levels, pair_from=None, pair_to=None):
+        self.ids = ids                    # sorted unique teacher ids
+        self.offsets = offsets            # records of ids[i] are rows offsets[i]:offsets[i + 1]
+        self.years = years                # per row, int16
+        self.districts = districts        # per row, code into district_levels (-1 = missing)
+        self.evals = evals                # per row, float32 (NaN = not scored)
+        self.district_levels = [str(level) for level in district_levels]
+        if pair_from is None:
+            pair_from, pair_to = consecutive_pairs(np.repeat(ids, np.diff(offsets)), years)
+        self.pair_from = pair_from        # row of a record...
+        self.pair_to = pair_to            # ...and a row of the same teacher in the next year
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build the index from the analysis frame in one sort."""
+        ids = frame["id"].to_numpy()
+        year_codes = frame["year"].array.codes
+        years = frame["year"].cat.categories.astype(int).to_numpy(np.int16)[year_codes]
+        districts = frame["districtname"].array.codes.astype(np.int16)
+        order = np.lexsort((districts, years, ids))
+        sorted_ids = ids[order]
+        unique_ids, starts = np.unique(sorted_ids, return_index=True)
+        offsets = np.append(starts, len(sorted_ids)).astype(np.int64)
+        return cls(unique_ids, offsets, years[order], districts[order],
+                   frame["eval"].to_numpy()[order], list(frame["districtname"].cat.categories))
+
+    def to_arrays(self):
+        """Return the index as plain arrays, for the shared store."""
+        return {
+            "ids": self.ids, "offsets": self.offsets, "years": self.years, "districts": self.districts,
+            "evals": self.evals, "district_levels": np.array(self.district_levels, dtype=str),
+            "pair_from": self.pair_from, "pair_to": self.pair_to,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _district_labels(self, codes):
+        return np.asarray(self.district_levels + [None], dtype=object)[codes]
+
+    def _district_code(self, district):
+        return self.district_levels.index(district) if district in self.district_levels else -2
+
+    def lookup(self, teacher_id):
+        """Return the records of one teacher (year, districtname, eval), oldest first."""
+        i = np.searchsorted(self.ids, teacher_id)
+        if i == len(self.ids) or self.ids[i] != teacher_id:
+            rows = slice(0, 0)
+        else:
+            rows = slice(self.offsets[i], self.offsets[i + 1])
+        return pd.DataFrame({
+            "year": self.years[rows],
+            "districtname": self._district_labels(self.districts[rows]),
+            "eval": self.evals[rows],
+        })
+
+    def _pairs(self, from_year=None, district=None):
+        """Indices of the consecutive-year pairs starting in `from_year` and in `district`."""
+        mask = np.ones(len(self.pair_from), dtype=bool)
+        if from_year is not None:
+            mask &= self.years[self.pair_from] == int(from_year)
+        if district is not None:
+            mask &= self.districts[self.pair_from] == self._district_code(district)
+        return self.pair_from[mask], self.pair_to[mask]
+
+    def score_changes(self, from_year=None, district=None):
+        """Return how many teachers changed score by each amount from one year to the next.
+
+        Only pairs scored in both years count; `from_year` and `district`
+        select pairs by their first year.
+        """
+        start, end = self._pairs(from_year, district)
+        change = self.evals[end] - self.evals[start]
+        change = change[~np.isnan(change)]
+        counts = pd.Series(change).value_counts().sort_index()
+        counts.index.name = "change"
+        return counts.rename("teachers")
+
+    def retention(self):
+        """Return, per year and district, the teachers present and how many return the next year.
+
+        `retained` counts teachers with a record in the next year in any
+        district, `same_district` those with a next-year record in the same
+        district. Counts are of records, so a teacher in two districts in one
+        year counts in both.
+        """
+        n_districts = len(self.district_levels) + 1
+        first_year = int(self.years.min()) if len(self.years) else 0
+        n_years = int(self.years.max()) - first_year + 1 if len(self.years) else 1
+
+        def cells(rows):
+            return (self.years[rows].astype(np.int64) - first_year) * n_districts + self.districts[rows] % n_districts
+
+        size = n_years * n_districts
+        present = np.bincount(cells(slice(None)), minlength=size)
+        # A record paired with several next-year records is retained once
+        retained = np.bincount(cells(np.unique(self.pair_from)), minlength=size)
+        stayed = self.districts[self.pair_from] == self.districts[self.pair_to]
+        same_district = np.bincount(cells(np.unique(self.pair_from[stayed])), minlength=size)
+        year_index, district_index = np.divmod(np.arange(size), n_districts)
+        table = pd.DataFrame({
+            "year": year_index + first_year,
+            "districtname": self._district_labels(np.where(district_index == n_districts - 1, -1, district_index)),
+            "teachers": present,
+            "retained": retained,
+            "same_district": same_district,
+        })
+        # The last year has no next year to return in
+        table = table[(table["teachers"] > 0) & (table["year"] < first_year + n_years - 1)]
+        table["retention_rate"] = table["retained"] / table["teachers"]
+        return table.reset_index(drop=True)
+
+    def transfers(self, from_year=None):
+        """Return a from-district x to-district matrix of teachers between consecutive years."""
+        start, end = self._pairs(from_year)
+        n = len(self.district_levels) + 1
+        counts = np.bincount(
+            (self.districts[start] % n).astype(np.int64) * n + self.districts[end] % n, minlength=n * n
+        ).reshape(n, n)
+        labels = self.district_levels + ["(missing)"]
+        matrix = pd.DataFrame(counts, index=pd.Index(labels, name="from"), columns=pd.Index(labels, name="to"))
+        keep = (matrix.sum(axis=0) + matrix.sum(axis=1)) > 0
+        return matrix.loc[keep, keep]
+
+
+def load_trajectories(path=DATA_FILE):
+    """Return the trajectory index for the current version of `path`, mapped from the shared store."""
+    def build(path):
+        arrays = shared_arrays(path, STORE_KIND,
+                               lambda p: TrajectoryIndex.from_frame(load_analysis_frame(p)).to_arrays())
+        return TrajectoryIndex.from_arrays(arrays)
+    return cached_by_version(path, "trajectories", build)